@@ -0,0 +1,13 @@
+# -*- coding: utf-8 -*-
+import sys
+
+collect_ignore = []
+
+# asyncio API requires Python 3.5+
+if sys.version_info < (3, 5):
+    collect_ignore += ['formasaurus/aio.py', 'formasaurus/contrib/scrapy.py']
+
+try:
+    import scrapy
+except ImportError:
+    collect_ignore += ['formasaurus/contrib/scrapy.py']
@@ -4,22 +4,64 @@
 Formasaurus command-line utility.
 
 Usage:
-    formasaurus init
-    formasaurus train <modelfile> [--data-folder <path>]
+    formasaurus init [--rebuild]
+    formasaurus train <modelfile> [--data-folder <path>] [--feature-cache <path>] [--jobs <n>] [--streaming] [--min-freq <n>] [--min-weight <w>] [--slim] [--slim-dtype <dtype>]
     formasaurus run <url> [modelfile] [--threshold <probability>]
+    formasaurus serve [--model <path>] [--host <host>] [--port <port>] [--workers <n>] [--threshold <probability>] [--background] [--strict] [--reload-interval <seconds>]
+    formasaurus worker [--model <path>] [--framing <framing>] [--threshold <probability>] [--strict]
     formasaurus check-data [--data-folder <path>]
-    formasaurus evaluate (forms|fields|all) [--cv <n_splits>] [--data-folder <path>]
+    formasaurus reindex [--data-folder <path>]
+    formasaurus storage compress [--compression <method>] [--data-folder <path>]
+    formasaurus evaluate (forms|fields|all) [--cv <n_splits>] [--data-folder <path>] [--feature-cache <path>] [--jobs <n>] [--early-stopping]
+    formasaurus evaluate (pruning|slimming) [--data-folder <path>] [--feature-cache <path>] [--jobs <n>]
+    formasaurus tune (forms|fields) [--cv <n_splits>] [--data-folder <path>] [--feature-cache <path>] [--jobs <n>]
     formasaurus -h | --help
     formasaurus --version
 
 Options:
     --data-folder <path>       path to the data folder
+    --rebuild                  retrain the default model even if it exists
     --cv <n_splits>            use <n_splits> for cross-validation [default: 20]
+    --feature-cache <path>     file to cache extracted form type detection
+                               features in
+    --jobs <n>                 number of processes to use; -1 means
+                               "use all CPUs". By default 1 process is used
+                               for training, all CPUs for evaluation.
+    --streaming                train on data which doesn't fit in memory
+    --early-stopping           stop CRF training when log-likelihood
+                               stops improving
+    --min-freq <n>             don't use field type detection features
+                               which occur less than <n> times [default: 0]
+    --min-weight <w>           prune field type detection features with
+                               weights below <w> [default: 0]
+    --slim                     prune vocabulary of form type detection model
+                               and store its coefficients as <dtype>
+    --slim-dtype <dtype>       coefficient type for --slim: float64, float32
+                               or int8 (with a per-class scale)
+                               [default: float32]
     --threshold <probability>  don't display predictions with probability below
                                this threshold [default: 0.05]
+    --compression <method>     compression method for HTML files:
+                               gzip, zstd or none [default: gzip]
+    --model <path>             model file to use instead of the default model
+    --host <host>              host to listen on [default: 127.0.0.1]
+    --port <port>              port to listen on [default: 8080]
+    --workers <n>              number of worker processes; -1 means
+                               "a process per CPU" [default: 1]
+    --background               start accepting connections before the model
+                               is loaded (single worker only)
+    --strict                   fail if the model file is missing instead
+                               of training a model
+    --reload-interval <seconds>
+                               reload the model when its file changes;
+                               check the file every <seconds> seconds
+    --framing <framing>        message framing for worker stdin/stdout:
+                               ndjson or length [default: ndjson]
 
 Formasaurus trains a model on a first call, and then caches it.
-You can request training&caching explicitly using `formasaurus init` command.
+You can request training&caching explicitly using `formasaurus init` command;
+use `formasaurus init --rebuild` to retrain the cached model (e.g. after
+running `formasaurus tune`).
 
 To train a custom extractor for HTML form classification use
 "formsasaurus train" command.
@@ -27,11 +69,37 @@ To train a custom extractor for HTML form classification use
 To classify forms from an URL using a saved extractor use
 "formasaurus run" command.
 
+To run an HTTP service which classifies forms in HTML pages
+use "formasaurus serve" command (see formasaurus.server module for
+the API description). In production use "formasaurus serve --strict"
+(or set FORMASAURUS_STRICT=1 environment variable) to make sure models
+are never trained on startup.
+
+To classify forms from other programming languages use
+"formasaurus worker" command: it loads the model once, reads JSON requests
+with HTML pages from stdin and writes JSON results to stdout
+(see formasaurus.worker module for the protocol description).
+
 To check the storage for consistency and print some stats use
 "formasaurus check-data" command.
 
+To store form fingerprints in the storage index (so that deduplication
+and statistics don't require parsing HTML) use "formasaurus reindex" command.
+
+To convert HTML files in the storage to a compressed format
+(or back to raw HTML) use "formasaurus storage compress" command.
+
 To check the estimated quality of the default form and form fields model
-use "formasaurus evaluate" command.
+use "formasaurus evaluate" command. "formasaurus evaluate pruning" shows
+how --min-freq and --min-weight options of "formasaurus train" affect size,
+speed and quality of the form fields model; "formasaurus evaluate slimming"
+shows the same for vocabulary pruning and quantization of the form model.
+
+To find better hyperparameters for the default form or form fields model
+use "formasaurus tune" command. Parameters are saved to a file which
+can be set using FORMASAURUS_PARAMS environment variable; models trained
+afterwards use them. The cached default model is not retrained
+automatically: run "formasaurus init --rebuild" to apply new parameters.
 """
 from __future__ import absolute_import, print_function
 import sys
@@ -40,10 +108,14 @@ from collections import Counter
 import docopt
 
 import formasaurus
-from formasaurus.utils import download
+from formasaurus.utils import (
+    download,
+    save_model_params,
+    get_model_params_path,
+)
 from formasaurus.storage import Storage
 from formasaurus.html import load_html, get_cleaned_form_html
-from formasaurus import formtype_model, fieldtype_model
+from formasaurus import formtype_model, fieldtype_model, server, worker
 from formasaurus.classifiers import DEFAULT_DATA_PATH
 
 
@@ -55,21 +127,43 @@ def main():
         data_folder = DEFAULT_DATA_PATH
 
     storage = Storage(data_folder)
+    feature_store = formtype_model.FeatureStore(args['--feature-cache'])
 
     if args['check-data']:
         errors = storage.check()
-        storage.print_form_type_counts(simplify=False)
-        storage.print_form_type_counts(simplify=True)
+        storage.print_all_form_type_counts()
         print("Errors:", errors)
         if errors:
             sys.exit(1)
 
+    elif args['reindex']:
+        storage.reindex()
+
+    elif args['storage'] and args['compress']:
+        compression = args['--compression']
+        if compression == 'none':
+            compression = None
+        converted = storage.compress(compression)
+        print("Files converted:", converted)
+
     elif args['train']:
-        ex = formasaurus.FormFieldClassifier.trained_on(data_folder)
+        # without a cache file form and field features
+        # are extracted concurrently
+        ex = formasaurus.FormFieldClassifier.trained_on(
+            data_folder,
+            form_feature_store=feature_store if feature_store.path else None,
+            n_jobs=int(args['--jobs'] or 1),
+            streaming=args['--streaming'],
+            field_min_freq=int(args['--min-freq']),
+            field_min_weight=float(args['--min-weight']),
+        )
+        if args['--slim']:
+            ex.form_classifier.slim(dtype=args['--slim-dtype'])
+        feature_store.save()
         ex.save(args["<modelfile>"])
 
     elif args['init']:
-        formasaurus.FormFieldClassifier.load()
+        formasaurus.FormFieldClassifier.load(rebuild=args['--rebuild'])
 
     elif args['run']:
         threshold = float(args['--threshold'])
@@ -102,6 +196,26 @@ def main():
 
             print("")
 
+    elif args['serve']:
+        server.serve(
+            model_path=args['--model'],
+            background=args['--background'],
+            strict=True if args['--strict'] else None,
+            reload_interval=float(args['--reload-interval'] or 0) or None,
+            host=args['--host'],
+            port=int(args['--port']),
+            workers=int(args['--workers']),
+            threshold=float(args['--threshold']),
+        )
+
+    elif args['worker']:
+        worker.run_worker(
+            model_path=args['--model'],
+            framing=args['--framing'],
+            threshold=float(args['--threshold']),
+            strict=True if args['--strict'] else None,
+        )
+
     elif args['evaluate']:
         n_splits = int(args["--cv"])
         annotations = list(
@@ -110,16 +224,70 @@ def main():
                                      simplify_field_types=True)
         )
 
+        n_jobs = int(args['--jobs'] or -1)
+        form_labels = None
+
+        if args['pruning']:
+            print("Evaluating form field classifier pruning...\n")
+            fieldtype_model.print_pruning_report(annotations, n_jobs=n_jobs)
+
+        if args['slimming']:
+            print("Evaluating form classifier slimming...\n")
+            formtype_model.print_slimming_report(annotations,
+                                                 feature_store=feature_store,
+                                                 n_jobs=n_jobs)
+
         if args['forms'] or args['all']:
             print("Evaluating form classifier...\n")
-            formtype_model.print_classification_report(annotations,
-                                                       n_splits=n_splits)
+            form_labels = formtype_model.print_classification_report(
+                annotations,
+                n_splits=n_splits,
+                feature_store=feature_store,
+                n_jobs=n_jobs,
+            )
             print("")
 
         if args['fields'] or args['all']:
             print("Evaluating form field classifier...\n")
-            fieldtype_model.print_classification_report(annotations,
-                                                        n_splits=n_splits)
+            # out-of-fold form type predictions are reused if available
+            fieldtype_model.print_classification_report(
+                annotations,
+                n_splits=n_splits,
+                form_feature_store=feature_store,
+                n_jobs=n_jobs,
+                realistic_form_types=form_labels,
+                early_stopping=args['--early-stopping'],
+            )
+
+        feature_store.save()
+
+    elif args['tune']:
+        n_splits = int(args["--cv"])
+        n_jobs = int(args['--jobs'] or -1)
+        annotations = list(
+            storage.iter_annotations(verbose=True, leave=True,
+                                     simplify_form_types=True,
+                                     simplify_field_types=True)
+        )
+        if args['forms']:
+            print("Tuning form classifier...")
+            params = formtype_model.tune(annotations, n_splits=n_splits,
+                                         feature_store=feature_store,
+                                         n_jobs=n_jobs, verbose=1)
+            feature_store.save()
+            save_model_params('forms', params)
+        else:
+            print("Tuning form field classifier...")
+            params = fieldtype_model.tune(annotations, n_splits=n_splits,
+                                          n_jobs=n_jobs, verbose=1)
+            save_model_params('fields', params)
+
+        print("Best hyperparameters:")
+        for key, value in sorted(params.items()):
+            print("    %s: %s" % (key, value))
+        print("Saved to %s" % get_model_params_path())
+        print("Run 'formasaurus init --rebuild' to retrain the default model "
+              "with these parameters.")
 
 
 if __name__ == '__main__':
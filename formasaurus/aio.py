@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+"""
+asyncio API for form extraction (Python 3.5+).
+
+Parsing and classification are CPU-bound, so they are offloaded
+to a thread or process executor, and the event loop is not blocked::
+
+    import formasaurus.aio
+
+    forms = await formasaurus.aio.extract_forms(html, proba=True)
+    results = await formasaurus.aio.extract_forms_many(pages,
+                                                       max_concurrency=4)
+
+By default the event loop default executor (a thread pool) is used.
+Threads share a single loaded :class:`~.FormFieldClassifier`.
+Use :func:`process_executor` to create a process pool, where
+each worker process loads the model once, when it starts.
+Threads don't help with CPU-bound work in CPython, so processes should be
+used to classify many pages in parallel.
+
+With a process executor ``tree_or_html`` must be HTML source code
+(lxml trees can't be sent to other processes), and returned form elements
+are parsed from form HTML in the calling process, so they don't belong
+to a document tree.
+"""
+from __future__ import absolute_import
+import asyncio
+import functools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import lxml.html
+
+from formasaurus import classifiers
+from formasaurus.html import load_html
+
+
+_worker_classifier = None
+
+
+def process_executor(max_workers=None, model_path=None):
+    """
+    Return a ProcessPoolExecutor which can be passed as ``executor``
+    argument to :func:`extract_forms` and :func:`extract_forms_many`.
+    Each worker process loads a model from ``model_path``
+    (the default model is used if ``model_path`` is None) when it starts.
+    """
+    kwargs = {}
+    if 'fork' in multiprocessing.get_all_start_methods():
+        # workers don't need to import everything again
+        kwargs['mp_context'] = multiprocessing.get_context('fork')
+    return ProcessPoolExecutor(max_workers=max_workers,
+                               initializer=_init_worker,
+                               initargs=(model_path,), **kwargs)
+
+
+def _init_worker(model_path):
+    global _worker_classifier
+    if model_path is None:
+        _worker_classifier = classifiers.get_instance()
+    else:
+        _worker_classifier = classifiers.FormFieldClassifier.load(model_path)
+
+
+def extract_forms_in_worker(html, kwargs, encoding=None):
+    """
+    Extract forms from HTML source code ``html`` in a process executor
+    worker (see :func:`process_executor`); ``kwargs`` are passed
+    to :meth:`.FormFieldClassifier.extract_forms`. Form elements can't be
+    sent to other processes, so ``(form_html, form_info)`` tuples
+    are returned; use :func:`parse_worker_forms` to get form elements
+    back in the calling process.
+    """
+    classifier = _worker_classifier or classifiers.get_instance()
+    forms = classifier.extract_forms(load_html(html, encoding=encoding),
+                                     **kwargs)
+    return classifiers.ExtractedForms(
+        [(lxml.html.tostring(form, encoding='unicode', with_tail=False), info)
+         for form, info in forms],
+        truncated=forms.truncated,
+    )
+
+
+def parse_worker_forms(forms):
+    """
+    Convert :func:`extract_forms_in_worker` result to
+    an :class:`~.ExtractedForms` list of ``(form_elem, form_info)`` tuples.
+    """
+    return classifiers.ExtractedForms(
+        [(lxml.html.fragment_fromstring(form_html), info)
+         for form_html, info in forms],
+        truncated=forms.truncated,
+    )
+
+
+async def extract_forms(tree_or_html, proba=False, threshold=0.05,
+                        fields=True, executor=None, classifier=None,
+                        max_forms=None, max_fields_per_form=None,
+                        max_options_per_select=None, timeout=None):
+    """
+    Coroutine version of :func:`formasaurus.extract_forms`.
+    Form extraction runs in ``executor`` (the event loop default
+    executor is used if it is None). ``classifier`` is a
+    :class:`~.FormFieldClassifier` to use with thread executors;
+    the shared instance (see :func:`formasaurus.classifiers.get_instance`)
+    is used by default.
+    """
+    loop = asyncio.get_event_loop()
+    kwargs = dict(proba=proba, threshold=threshold, fields=fields,
+                  max_forms=max_forms,
+                  max_fields_per_form=max_fields_per_form,
+                  max_options_per_select=max_options_per_select,
+                  timeout=timeout)
+
+    if isinstance(executor, ProcessPoolExecutor):
+        if not isinstance(tree_or_html, (str, bytes)):
+            raise TypeError("HTML source code is required for "
+                            "process executors")
+        forms = await loop.run_in_executor(
+            executor, extract_forms_in_worker, tree_or_html, kwargs)
+        return parse_worker_forms(forms)
+
+    if classifier is None:
+        classifier = await loop.run_in_executor(executor,
+                                                classifiers.get_instance)
+    func = functools.partial(classifier.extract_forms, tree_or_html, **kwargs)
+    return await loop.run_in_executor(executor, func)
+
+
+async def extract_forms_many(pages, proba=False, threshold=0.05, fields=True,
+                             executor=None, classifier=None,
+                             max_concurrency=None, return_exceptions=False,
+                             max_forms=None, max_fields_per_form=None,
+                             max_options_per_select=None, timeout=None):
+    """
+    Extract forms from several pages (an iterable of lxml trees or
+    HTML source codes) concurrently; return a list with
+    :func:`extract_forms` results, a result per page. Work budgets
+    (``max_forms``, ``max_fields_per_form``, ``max_options_per_select``
+    and ``timeout``) are applied to each page.
+
+    At most ``max_concurrency`` pages are submitted to the executor
+    at the same time (no limit if it is None). If the coroutine is
+    cancelled, pages which are not started yet are not processed.
+    If ``return_exceptions`` is True, errors are returned in place
+    of results instead of being raised.
+    """
+    if max_concurrency is not None and max_concurrency < 1:
+        raise ValueError("max_concurrency must be positive")
+    loop = asyncio.get_event_loop()
+    if classifier is None and not isinstance(executor, ProcessPoolExecutor):
+        classifier = await loop.run_in_executor(executor,
+                                                classifiers.get_instance)
+
+    semaphore = None
+    if max_concurrency is not None:
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def extract(page):
+        kwargs = dict(proba=proba, threshold=threshold, fields=fields,
+                      executor=executor, classifier=classifier,
+                      max_forms=max_forms,
+                      max_fields_per_form=max_fields_per_form,
+                      max_options_per_select=max_options_per_select,
+                      timeout=timeout)
+        if semaphore is None:
+            return await extract_forms(page, **kwargs)
+        async with semaphore:
+            return await extract_forms(page, **kwargs)
+
+    return await asyncio.gather(*[extract(page) for page in pages],
+                                return_exceptions=return_exceptions)
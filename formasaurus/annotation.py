@@ -2,8 +2,6 @@
 from __future__ import absolute_import, print_function
 import collections
 
-from sklearn.model_selection import GroupKFold
-
 from formasaurus.html import get_fields_to_annotate
 from formasaurus.utils import get_domain
 
@@ -25,6 +23,14 @@ class FormAnnotation(_FormAnnotation):
     def url(self):
         return self.info['url']
 
+    @property
+    def domain(self):
+        """
+        Domain name of the web page, without public suffix; it is used
+        for grouping annotations in cross-validation.
+        """
+        return get_domain(self.url)
+
     @property
     def fields(self):
         """
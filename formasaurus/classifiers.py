@@ -1,19 +1,60 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import
 import os
+import copy
+import time
+import threading
+from concurrent.futures import Future
 
 import six
 import joblib
 
 from formasaurus import formtype_model, fieldtype_model
 from formasaurus.html import get_forms, get_fields_to_annotate, load_html
+from formasaurus.results import FormProba
 from formasaurus.storage import Storage
-from formasaurus.utils import dependencies_string, at_root, thresholded
+from formasaurus.utils import (
+    dependencies_string,
+    at_root,
+    thresholded,
+    iter_chunks,
+    fork_call,
+    freeze_gc,
+    is_strict_mode,
+)
 
 DEFAULT_DATA_PATH = at_root('data')
-
-
-def extract_forms(tree_or_html, proba=False, threshold=0.05, fields=True):
+FIELD_TRAINING_DATA_SUFFIX = '.field-training-data'
+
+# synthetic forms used to warm up the models
+_WARMUP_HTML = u"""
+<form action="/login" method="post">
+    <label for="username">Username</label>
+    <input id="username" name="username" type="text"/>
+    <input name="password" type="password" placeholder="Password"/>
+    <select name="lang"><option value="en">English</option></select>
+    <input type="checkbox" name="remember"/> Remember me
+    <input type="submit" value="Login"/>
+</form>
+<form action="/search" method="get">
+    <input name="q" type="search" title="Search"/>
+    <button type="submit">Search</button>
+</form>
+<form action="/register" method="post">
+    Email: <input name="email" type="email"/>
+    Password: <input name="password1" type="password"/>
+    Confirm password: <input name="password2" type="password"/>
+    About you: <textarea name="about"></textarea>
+    <input type="radio" name="gender" value="f"/> F
+    <input type="radio" name="gender" value="m"/> M
+    <input type="submit" value="Sign up"/>
+</form>
+"""
+
+
+def extract_forms(tree_or_html, proba=False, threshold=0.05, fields=True,
+                  max_forms=None, max_fields_per_form=None,
+                  max_options_per_select=None, timeout=None, compact=False):
     """
     Given a lxml tree or HTML source code, return a list of
     ``(form_elem, form_info)`` tuples.
@@ -22,27 +63,48 @@ def extract_forms(tree_or_html, proba=False, threshold=0.05, fields=True):
     :meth:`classify_proba`` calls, depending on ``proba`` parameter.
 
     When ``fields`` is False, field type information is not computed.
+
+    See :meth:`FormFieldClassifier.extract_forms` for a description
+    of ``max_forms``, ``max_fields_per_form``, ``max_options_per_select``,
+    ``timeout`` and ``compact`` arguments.
     """
     return get_instance().extract_forms(
         tree_or_html=tree_or_html,
         proba=proba,
         threshold=threshold,
         fields=fields,
+        max_forms=max_forms,
+        max_fields_per_form=max_fields_per_form,
+        max_options_per_select=max_options_per_select,
+        timeout=timeout,
+        compact=compact,
     )
 
 
-def classify(form, fields=True):
+def classify(form, fields=True, max_fields_per_form=None,
+             max_options_per_select=None, deadline=None):
     """
     Return ``{'form': 'type', 'fields': {'name': 'type', ...}}``
     dict with form type and types of its visible submittable fields.
 
     If ``fields`` argument is False, only information about form type is
     returned: ``{'form': 'type'}``.
+
+    See :meth:`FormFieldClassifier.classify` for a description
+    of ``max_fields_per_form``, ``max_options_per_select`` and ``deadline``
+    arguments.
     """
-    return get_instance().classify(form, fields=fields)
+    return get_instance().classify(
+        form,
+        fields=fields,
+        max_fields_per_form=max_fields_per_form,
+        max_options_per_select=max_options_per_select,
+        deadline=deadline,
+    )
 
 
-def classify_proba(form, threshold=0.0, fields=True):
+def classify_proba(form, threshold=0.0, fields=True, max_fields_per_form=None,
+                   max_options_per_select=None, deadline=None, compact=False):
     """
     Return dict with probabilities of ``form`` and its fields belonging
     to various form and field classes::
@@ -64,50 +126,221 @@ def classify_proba(form, threshold=0.0, fields=True):
             'form': {'type1': prob1, 'type2': prob2, ...}
         }
 
+    If ``compact`` is True, a :class:`~.FormProba` instance is returned
+    instead of a dict.
+
+    See :meth:`FormFieldClassifier.classify` for a description
+    of ``max_fields_per_form``, ``max_options_per_select`` and ``deadline``
+    arguments.
     """
     return get_instance().classify_proba(
         form=form,
         threshold=threshold,
         fields=fields,
+        max_fields_per_form=max_fields_per_form,
+        max_options_per_select=max_options_per_select,
+        deadline=deadline,
+        compact=compact,
     )
 
 
+class ExtractedForms(list):
+    """
+    A list of ``(form_elem, form_info)`` tuples returned by
+    :meth:`FormFieldClassifier.extract_forms`. ``truncated`` attribute
+    is True if some forms on a page were not processed because of
+    ``max_forms`` or ``timeout`` limits.
+    """
+    def __init__(self, forms=(), truncated=False):
+        super(ExtractedForms, self).__init__(forms)
+        self.truncated = truncated
+
+
 class FormFieldClassifier(object):
     """
     FormFieldClassifier detects HTML form and field types.
+
+    If ``thread_safe`` is True, the classifier can be used from several
+    threads at the same time: each thread gets its own CRFsuite tagger
+    (CRFsuite taggers keep the state of a current sequence, so they
+    can't be shared). Form type detector is stateless and it is shared
+    by all threads.
     """
-    def __init__(self, form_classifier=None, field_model=None):
+    def __init__(self, form_classifier=None, field_model=None,
+                 thread_safe=False):
         self.form_classifier = form_classifier
         self._field_model = field_model
+        self._field_training_data = None
+        self._field_training_data_path = None
+        self.thread_safe = thread_safe
+
+    def __getstate__(self):
+        dct = self.__dict__.copy()
+        dct.pop('_thread_local', None)
+        # field type detector training data can be large;
+        # it is saved to a separate file (see save method)
+        dct['_field_training_data'] = None
+        dct['_field_training_data_path'] = None
+        return dct
 
     @classmethod
-    def load(cls, filename=None, autocreate=True, rebuild=False):
+    def preload_for_fork(cls, filename=None):
+        """
+        Load a model and prepare it to be shared by forked worker
+        processes (e.g. call it in a gunicorn master process, in a module
+        imported with ``--preload`` option). If ``filename`` is None,
+        the default model is loaded, and it becomes the shared instance
+        used by :func:`formasaurus.extract_forms` and other module-level
+        functions.
+
+        Lazily created structures (CRFsuite tagger, class lists, etc.)
+        are created in advance, and then all objects are moved out of
+        garbage collector tracking (see :func:`formasaurus.utils.freeze_gc`),
+        so that garbage collection in workers doesn't write to memory pages
+        of the model, and they stay shared. Reference counts of objects
+        used at prediction time are still updated, but the bulk of model
+        memory (numpy arrays, CRFsuite model) is not touched.
+        """
+        if filename is None:
+            ex = get_instance()
+        else:
+            ex = cls.load(filename, thread_safe=True)
+        ex.warmup()
+        freeze_gc()
+        return ex
+
+    def warmup(self):
+        """
+        Run a few synthetic forms through form and field type detection
+        models, so that lazily initialized structures (CRFsuite tagger,
+        class lists, etc.) are created, and the first real request
+        doesn't pay for that. In thread-safe mode other threads
+        still create their own taggers on first use.
+        """
+        self._get_field_model().tagger_
+        self.extract_forms(_WARMUP_HTML, proba=True)
+        self.extract_forms(_WARMUP_HTML, proba=True, compact=True)
+        self.extract_forms(_WARMUP_HTML, proba=False)
+
+    @classmethod
+    def load(cls, filename=None, autocreate=True, rebuild=False,
+             thread_safe=False, strict=None):
         """
         Load extractor from file ``filename``.
 
         If the file is missing and ``autocreate`` option is True (default),
         the model is created using default parameters and training data.
         If ``filename`` is None then default model file name is used.
+        See :class:`FormFieldClassifier` for ``thread_safe`` argument
+        description.
+
+        In strict mode (``strict=True``; if ``strict`` is None, it is
+        enabled by FORMASAURUS_STRICT environment variable) models are never
+        trained: IOError is raised if the file is missing, and
+        ``rebuild=True`` is not allowed. Use it in production to fail fast
+        instead of training a model for minutes on startup.
 
         Example - load the default extractor::
 
             ffc = FormFieldClassifier.load()
 
         """
+        if strict is None:
+            strict = is_strict_mode()
         if filename is None:
             filename = cls._cached_model_path()
 
+        if strict:
+            if rebuild:
+                raise ValueError("rebuild=True is not allowed in strict mode")
+            if not os.path.exists(filename):
+                raise IOError("Model file %s is not found. Models are not "
+                              "trained in strict mode; run 'formasaurus "
+                              "init' to train the default model, or "
+                              "'formasaurus train' to train a custom "
+                              "model." % filename)
         if rebuild or (autocreate and not os.path.exists(filename)):
             ex = cls.trained_on(DEFAULT_DATA_PATH)
             ex.save(filename)
-            return ex
+        else:
+            ex = joblib.load(filename)
+        data_filename = filename + FIELD_TRAINING_DATA_SUFFIX
+        if os.path.exists(data_filename):
+            ex._field_training_data_path = data_filename
+        ex.thread_safe = thread_safe
+        return ex
 
-        return joblib.load(filename)
+    @classmethod
+    def load_async(cls, filename=None, warmup=True, executor=None, **kwargs):
+        """
+        Start loading an extractor in background and return
+        a ``concurrent.futures.Future`` which resolves to
+        a :class:`FormFieldClassifier` instance when the model is loaded
+        (and warmed up, if ``warmup`` is True - see :meth:`warmup`).
+        The future's exception is set if loading fails.
+
+        The model is loaded in a new daemon thread, or in ``executor``
+        (a thread pool) if it is passed. Other keyword arguments
+        are passed to :meth:`load`; pass ``strict=True`` to make sure
+        the model is not trained implicitly.
+
+        Example - start accepting requests before the model is loaded::
+
+            future = FormFieldClassifier.load_async(strict=True)
+            ...
+            if future.done() and not future.exception():
+                ffc = future.result()
+
+        """
+        if executor is not None:
+            return executor.submit(cls._load_and_warmup, filename, warmup,
+                                   kwargs)
+
+        future = Future()
+
+        def run():
+            if not future.set_running_or_notify_cancel():
+                return
+            try:
+                ex = cls._load_and_warmup(filename, warmup, kwargs)
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(ex)
+
+        thread = threading.Thread(target=run, name='formasaurus-load')
+        thread.daemon = True
+        thread.start()
+        return future
 
     @classmethod
-    def trained_on(cls, data_folder):
-        """ Return Formasaurus object trained on data from data_folder """
+    def _load_and_warmup(cls, filename, warmup, kwargs):
+        ex = cls.load(filename, **kwargs)
+        if warmup:
+            ex.warmup()
+        return ex
+
+    @classmethod
+    def trained_on(cls, data_folder, form_feature_store=None, n_jobs=1,
+                   incremental=False, streaming=False, concurrent=True,
+                   field_min_freq=0, field_min_weight=0):
+        """
+        Return Formasaurus object trained on data from data_folder.
+        ``form_feature_store`` is an optional
+        :class:`formasaurus.formtype_model.FeatureStore` instance with cached
+        form type detection features; ``n_jobs`` is a number of processes
+        to use for feature extraction. See :meth:`train` for
+        description of other arguments.
+
+        If ``streaming`` is True, training data is not loaded to memory
+        at once (see :meth:`train_streaming`).
+        """
         store = Storage(data_folder)
+        if streaming:
+            ex = cls()
+            ex.train_streaming(store, n_jobs=n_jobs)
+            return ex
+
         print("Loading training data...")
         annotations = list(store.iter_annotations(
             simplify_form_types=True,
@@ -116,50 +349,216 @@ class FormFieldClassifier(object):
             leave=True,
         ))
         ex = cls()
-        ex.train(annotations)
+        ex.train(annotations, form_feature_store=form_feature_store,
+                 n_jobs=n_jobs, incremental=incremental,
+                 concurrent=concurrent, field_min_freq=field_min_freq,
+                 field_min_weight=field_min_weight)
         return ex
 
     def save(self, filename):
+        """
+        Save the extractor to a file. The file is replaced atomically,
+        so processes which load or watch it (see
+        :class:`formasaurus.watcher.ModelWatcher`) never see
+        a partially written model.
+
+        Field type detector training data of a model trained with
+        ``incremental=True`` option (CRF features of all training
+        examples - it is often several times larger than the model itself)
+        is saved to a separate ``<filename>.field-training-data`` file;
+        it is only loaded by :meth:`update`.
+        """
         if self.form_classifier is None or self._field_model is None:
             raise ValueError("FormFieldExtractor is not trained")
-        joblib.dump(self, filename, compress=3)
+        data_filename = filename + FIELD_TRAINING_DATA_SUFFIX
+        training_data = self._get_field_training_data()
+        if training_data is not None:
+            _dump_atomic(training_data, data_filename)
+        elif os.path.exists(data_filename):
+            os.remove(data_filename)
+        _dump_atomic(self, filename)
+
+    def train(self, annotations, form_feature_store=None, n_jobs=1,
+              incremental=False, concurrent=True, field_min_freq=0,
+              field_min_weight=0):
+        """
+        Train FormFieldExtractor on a list of FormAnnotation objects.
+        ``n_jobs`` is a number of processes to use for feature extraction;
+        -1 means "use all CPUs".
+
+        If ``incremental`` is True, the classifier can be updated
+        with new annotations using :meth:`update`. In this mode form type
+        detector uses hashed features and SGD training, and field
+        type detector training data is kept (see :meth:`save`).
+
+        Field type detector is trained on gold form types, so it doesn't
+        depend on form type detector. If ``concurrent`` is True (default),
+        both models are trained at the same time in separate processes.
+        Feature extraction of each model then happens in a single
+        process, unless features are cached in ``form_feature_store``.
+        Processes are forked only from the main thread when no other
+        non-daemon threads are running (e.g. not when a model is trained
+        by :meth:`load_async` or in a server); otherwise models
+        are trained one after another.
+
+        ``field_min_freq`` and ``field_min_weight`` allow to make field type
+        detector smaller by dropping rare features and features with
+        small weights; see :func:`formasaurus.fieldtype_model.train`
+        (and :func:`formasaurus.fieldtype_model.print_pruning_report`
+        for their effect on quality). They are not used in
+        incremental mode.
+        """
+        if concurrent and form_feature_store is not None:
+            # extract missing features in this process, so that
+            # they are kept in the cache
+            form_feature_store.get_raw_features(
+                [ann.form for ann in annotations], n_jobs=n_jobs)
+
+        def train_form_classifier():
+            print("Training form type detector on %d example(s)..." % len(annotations))
+            form_classifier = FormClassifier(full_type_names=True)
+            form_classifier.train(annotations, feature_store=form_feature_store,
+                                  n_jobs=n_jobs, incremental=incremental)
+            return form_classifier
+
+        def train_field_model():
+            print("Training field type detector...")
+            if incremental:
+                return fieldtype_model.update(
+                    crf=fieldtype_model.get_model(use_precise_form_types=True),
+                    annotations=annotations,
+                    full_form_type_names=True,
+                    full_field_type_names=True,
+                    n_jobs=n_jobs,
+                )
+            field_model = fieldtype_model.train(
+                annotations=annotations,
+                use_precise_form_types=True,
+                full_field_type_names=True,
+                full_form_type_names=True,
+                verbose=True,
+                n_jobs=n_jobs,
+                min_freq=field_min_freq,
+                min_weight=field_min_weight,
+            )
+            return field_model, None
+
+        funcs = [train_form_classifier, train_field_model]
+        if concurrent:
+            form_classifier, field_result = fork_call(funcs)
+        else:
+            form_classifier, field_result = [func() for func in funcs]
+        self.form_classifier = form_classifier
+        self._field_model, self._field_training_data = field_result
+        self._field_training_data_path = None
 
-    def train(self, annotations):
-        """ Train FormFieldExtractor on a list of FormAnnotation objects. """
-        print("Training form type detector on %d example(s)..." % len(annotations))
+    def train_streaming(self, storage, chunk_size=500, n_epochs=5, n_jobs=1):
+        """
+        Train FormFieldExtractor on annotations from a
+        :class:`~.Storage` which may be too large to fit in memory.
+
+        Annotations are loaded and processed in chunks of ``chunk_size``
+        forms, so parsed HTML trees of only one chunk are kept in memory.
+        Form type detector is an incremental model (hashed features,
+        SGD training), trained for ``n_epochs`` passes over the data.
+        Field type detector features are passed to CRFsuite as they are
+        computed.
+        """
+        def iter_annotations():
+            return storage.iter_annotations(simplify_form_types=True,
+                                            simplify_field_types=True,
+                                            verbose=True, leave=True)
+
+        form_schema = storage.get_form_schema()
+        records = storage.iter_form_records(drop_duplicates=False,
+                                            simplify_form_types=True)
+        classes = {form_schema.types_inv[tp] for path, idx, tp in records}
+
+        print("Training form type detector...")
         self.form_classifier = FormClassifier(full_type_names=True)
-        self.form_classifier.train(annotations)
+        self.form_classifier.model = formtype_model.train_streaming(
+            iter_chunks=lambda: iter_chunks(iter_annotations(), chunk_size),
+            classes=classes,
+            full_type_names=True,
+            n_epochs=n_epochs,
+        )
 
         print("Training field type detector...")
-        self._field_model = fieldtype_model.train(
-            annotations=annotations,
-            use_precise_form_types=True,
+        self._field_training_data = None
+        self._field_training_data_path = None
+        self._field_model = fieldtype_model.train_streaming(
+            annotations=iter_annotations(),
+            full_form_type_names=True,
             full_field_type_names=True,
+            chunk_size=chunk_size,
+            n_jobs=n_jobs,
+        )
+
+    def update(self, annotations, n_jobs=1):
+        """
+        Update FormFieldClassifier trained with ``incremental=True``
+        option using a list of new FormAnnotation objects. Form type detector
+        is updated in-place; field type detector is refit using stored
+        features of previous training examples, so updates take as long
+        as CRF training on all data, and training data stays in memory
+        after the call. The new field type detector replaces the old one
+        only when it is trained; until then other threads keep using
+        the old one.
+        """
+        training_data = self._get_field_training_data()
+        if training_data is None:
+            raise ValueError("FormFieldClassifier can't be updated; train "
+                             "it with incremental=True option.")
+        self.form_classifier.update(annotations)
+        self._field_model, self._field_training_data = fieldtype_model.update(
+            crf=self._field_model,
+            annotations=annotations,
+            training_data=training_data,
             full_form_type_names=self.form_classifier.full_type_names,
-            verbose=True,
+            full_field_type_names=True,
+            n_jobs=n_jobs,
         )
 
-    def classify(self, form, fields=True):
+    def classify(self, form, fields=True, max_fields_per_form=None,
+                 max_options_per_select=None, deadline=None):
         """
         Return ``{'form': 'type', 'fields': {'name': 'type', ...}}``
         dict with form type and types of its visible submittable fields.
 
         If ``fields`` argument is False, only information about form type is
         returned: ``{'form': 'type'}``.
+
+        Work budgets limit the time spent on pathological forms:
+
+        * only first ``max_fields_per_form`` fields are classified;
+        * only first ``max_options_per_select`` <option> elements
+          of each <select> field are used to classify it;
+        * fields are not classified if ``deadline`` (a :func:`time.time`
+          value) is passed when the form type is detected.
+
+        When a limit is hit, ``'truncated': True`` is added to the result.
         """
         form_type = self.form_classifier.classify(form)
         res = {'form': form_type}
         if fields:
-            field_elems = get_fields_to_annotate(form)
-            xseq = fieldtype_model.get_form_features(form, form_type, field_elems)
-            yseq = self._field_model.predict_single(xseq)
-            res['fields'] = {
-                elem.name: cls
-                for elem, cls in zip(field_elems, yseq)
-            }
+            field_elems, truncated = self._get_fields_within_budget(
+                form, max_fields_per_form, max_options_per_select, deadline)
+            if truncated:
+                res['truncated'] = True
+            res['fields'] = {}
+            if field_elems:
+                xseq = fieldtype_model.get_form_features(
+                    form, form_type, field_elems, max_options_per_select)
+                yseq = self._get_field_model().predict_single(xseq)
+                res['fields'] = {
+                    elem.name: cls
+                    for elem, cls in zip(field_elems, yseq)
+                }
         return res
 
-    def classify_proba(self, form, threshold=0.0, fields=True):
+    def classify_proba(self, form, threshold=0.0, fields=True,
+                       max_fields_per_form=None, max_options_per_select=None,
+                       deadline=None, compact=False):
         """
         Return dict with probabilities of ``form`` and its fields belonging
         to various form and field classes::
@@ -181,51 +580,163 @@ class FormFieldClassifier(object):
                 'form': {'type1': prob1, 'type2': prob2, ...}
             }
 
+        If ``compact`` is True, a :class:`~.FormProba` instance is returned
+        instead of a dict; it keeps probabilities in arrays and creates
+        dict views only on access.
+
+        See :meth:`classify` for a description of ``max_fields_per_form``,
+        ``max_options_per_select`` and ``deadline`` arguments.
         """
-        form_types_proba = self.form_classifier.classify_proba(form, threshold)
-        res = {'form': form_types_proba}
+        form_probs = self.form_classifier.model.predict_proba([form])[0]
+        form_classes = self.form_classes
+        if compact:
+            res = FormProba(form_classes, form_probs, threshold=threshold)
+        else:
+            res = {'form': self.form_classifier._probs2dict(form_probs,
+                                                            threshold)}
 
         if fields:
-            form_type = max(form_types_proba, key=lambda p: form_types_proba[p])
-            field_elems = get_fields_to_annotate(form)
-            xseq = fieldtype_model.get_form_features(form, form_type, field_elems)
-            yseq = self._field_model.predict_marginals_single(xseq)
-            res['fields'] = {
-                elem.name: thresholded(probs, threshold)
-                for elem, probs in zip(field_elems, yseq)
-            }
+            form_type = form_classes[form_probs.argmax()]
+            field_elems, truncated = self._get_fields_within_budget(
+                form, max_fields_per_form, max_options_per_select, deadline)
+            xseq = []
+            if field_elems:
+                xseq = fieldtype_model.get_form_features(
+                    form, form_type, field_elems, max_options_per_select)
+            field_model = self._get_field_model()
+            if compact:
+                res.field_names = [elem.name for elem in field_elems]
+                res.field_classes, res.field_probs = (
+                    fieldtype_model.predict_marginals(field_model, xseq))
+                res.truncated = truncated
+            else:
+                yseq = field_model.predict_marginals_single(xseq) if xseq else []
+                res['fields'] = {
+                    elem.name: thresholded(probs, threshold)
+                    for elem, probs in zip(field_elems, yseq)
+                }
+                if truncated:
+                    res['truncated'] = True
 
         return res
 
     def extract_forms(self, tree_or_html, proba=False, threshold=0.05,
-                      fields=True):
+                      fields=True, max_forms=None, max_fields_per_form=None,
+                      max_options_per_select=None, timeout=None,
+                      compact=False):
         """
         Given a lxml tree or HTML source code, return a list of
-        ``(form_elem, form_info)`` tuples.
+        ``(form_elem, form_info)`` tuples (an :class:`ExtractedForms`
+        instance).
 
         ``form_info`` dicts contain results of :meth:`classify` or
         :meth:`classify_proba`` calls, depending on ``proba`` parameter.
 
         When ``fields`` is False, field type information is not computed.
+
+        Only first ``max_forms`` forms on a page are processed,
+        and forms are not processed after ``timeout`` seconds;
+        ``truncated`` attribute of the result is True if some forms
+        are skipped. ``max_fields_per_form`` and ``max_options_per_select``
+        are passed to :meth:`classify` or :meth:`classify_proba`.
+
+        If both ``proba`` and ``compact`` are True, ``form_info``
+        objects are :class:`~.FormProba` instances.
         """
+        deadline = None if timeout is None else time.time() + timeout
         if isinstance(tree_or_html, (six.string_types, bytes)):
             tree = load_html(tree_or_html)
         else:
             tree = tree_or_html
         forms = get_forms(tree)
-        if proba:
-            return [(form, self.classify_proba(form, threshold, fields))
-                    for form in forms]
-        else:
-            return [(form, self.classify(form, fields)) for form in forms]
+        res = ExtractedForms()
+        if max_forms is not None and len(forms) > max_forms:
+            forms = forms[:max_forms]
+            res.truncated = True
+
+        budget = dict(
+            max_fields_per_form=max_fields_per_form,
+            max_options_per_select=max_options_per_select,
+            deadline=deadline,
+        )
+        for form in forms:
+            if deadline is not None and time.time() >= deadline:
+                res.truncated = True
+                break
+            if proba:
+                info = self.classify_proba(form, threshold, fields,
+                                           compact=compact, **budget)
+            else:
+                info = self.classify(form, fields, **budget)
+            res.append((form, info))
+        return res
+
+    def _get_fields_within_budget(self, form, max_fields_per_form,
+                                  max_options_per_select, deadline):
+        """
+        Return ``(field_elems, truncated)`` tuple: a list of field elements
+        to classify, and a flag which is True if some fields or options
+        are skipped.
+        """
+        if deadline is not None and time.time() >= deadline:
+            return [], True
+        truncated = False
+        field_elems = get_fields_to_annotate(form)
+        if (max_fields_per_form is not None and
+                len(field_elems) > max_fields_per_form):
+            field_elems = field_elems[:max_fields_per_form]
+            truncated = True
+        if max_options_per_select is not None and not truncated:
+            for elem in field_elems:
+                if elem.tag != 'select':
+                    continue
+                options = fieldtype_model.get_select_options(
+                    elem, max_options_per_select + 1)
+                if len(options) > max_options_per_select:
+                    truncated = True
+                    break
+        return field_elems, truncated
+
+    def _get_field_model(self):
+        """
+        Return field type detection CRF model to use in the current thread.
+        In thread-safe mode it is a per-thread shallow copy of the model,
+        with its own CRFsuite tagger.
+        """
+        if not getattr(self, 'thread_safe', False):
+            return self._field_model
+        local = self.__dict__.get('_thread_local')
+        if local is None:
+            with _lock:
+                local = self.__dict__.setdefault('_thread_local',
+                                                 threading.local())
+        # the model can be replaced (see update method); it is never
+        # changed in-place, so a copy is made from a finished model
+        field_model = self._field_model
+        key = id(field_model), field_model.modelfile.name
+        if getattr(local, 'key', None) != key:
+            local.field_model = copy.copy(field_model)
+            local.key = key
+        return local.field_model
+
+    def _get_field_training_data(self):
+        """
+        Return field type detection training data, loading it from
+        a file saved next to the model if needed.
+        """
+        if getattr(self, '_field_training_data', None) is None:
+            self._field_training_data = None
+            path = getattr(self, '_field_training_data_path', None)
+            if path is not None:
+                self._field_training_data = joblib.load(path)
+        return self._field_training_data
 
     @classmethod
     def _cached_model_path(cls):
         env_path = os.environ.get("FORMASAURUS_MODEL")
         if env_path:
             return os.path.expanduser(env_path)
-        path = "formasaurus-%s.joblib" % dependencies_string()
-        return at_root(path)
+        return at_root("formasaurus-%s.joblib" % dependencies_string())
 
     @property
     def form_classes(self):
@@ -235,7 +746,7 @@ class FormFieldClassifier(object):
     @property
     def field_classes(self):
         """ Possible field classes """
-        return self._field_model.classes_
+        return self._get_field_model().classes_
 
 
 class FormClassifier(object):
@@ -261,11 +772,42 @@ class FormClassifier(object):
         probs = self.model.predict_proba([form])[0]
         return self._probs2dict(probs, threshold)
 
-    def train(self, annotations):
-        """ Train FormExtractor on a list of FormAnnotation objects. """
+    def train(self, annotations, feature_store=None, n_jobs=1,
+              incremental=False):
+        """
+        Train FormExtractor on a list of FormAnnotation objects.
+        ``feature_store`` is an optional
+        :class:`formasaurus.formtype_model.FeatureStore` instance;
+        ``n_jobs`` is a number of processes to use for feature extraction.
+        If ``incremental`` is True, the model can be updated using
+        :meth:`update`.
+        """
         self.model = formtype_model.train(
             annotations=annotations,
             full_type_names=self.full_type_names,
+            feature_store=feature_store,
+            n_jobs=n_jobs,
+            incremental=incremental,
+        )
+
+    def slim(self, min_weight=1e-2, dtype='float32'):
+        """
+        Make the model smaller and faster to load by pruning vocabulary
+        entries with small weights and storing coefficients
+        as ``dtype``. See :func:`formasaurus.formtype_model.slim`.
+        """
+        self.model = formtype_model.slim(self.model, min_weight=min_weight,
+                                         dtype=dtype)
+
+    def update(self, annotations):
+        """
+        Update a model trained with ``incremental=True`` option
+        using a list of new FormAnnotation objects.
+        """
+        formtype_model.update(
+            model=self.model,
+            annotations=annotations,
+            full_type_names=self.full_type_names,
         )
 
     def extract_forms(self, tree_or_html, proba=False, threshold=0.05):
@@ -289,15 +831,63 @@ class FormClassifier(object):
         return self.model.steps[-1][1].classes_
 
     def _probs2dict(self, probs, threshold):
-        return thresholded(dict(zip(self.classes, probs)), threshold)
+        return {cls: prob for cls, prob in zip(self.classes, probs)
+                if prob >= threshold}
 
 
 
 _form_field_classifier = None
+_lock = threading.RLock()
+_replace_file = getattr(os, 'replace', os.rename)  # Python 2: no os.replace
+
+
+def _dump_atomic(obj, filename):
+    tmp_filename = "%s.tmp%d" % (filename, os.getpid())
+    try:
+        joblib.dump(obj, tmp_filename, compress=3)
+        _replace_file(tmp_filename, filename)
+    finally:
+        if os.path.exists(tmp_filename):
+            os.remove(tmp_filename)
+
 
 def get_instance():
-    """ Return a shared FormFieldClassifier instance """
+    """
+    Return a shared FormFieldClassifier instance. It is thread-safe:
+    the model is loaded only once, even if the first calls are concurrent,
+    and the instance can be used from several threads.
+    In strict mode (see :meth:`FormFieldClassifier.load`)
+    the default model must be trained in advance.
+    """
     global _form_field_classifier
     if _form_field_classifier is None:
-        _form_field_classifier = FormFieldClassifier.load()
+        with _lock:
+            if _form_field_classifier is None:
+                _form_field_classifier = FormFieldClassifier.load(
+                    thread_safe=True)
     return _form_field_classifier
+
+
+def watch_model(interval=5.0):
+    """
+    Start reloading the shared instance (see :func:`get_instance`)
+    when the default model file changes (FORMASAURUS_MODEL environment
+    variable can be used to set it); the file is checked every ``interval``
+    seconds. The new model is loaded and warmed up in a background thread,
+    and then it replaces the shared instance; calls which are already
+    running finish using the old model.
+
+    Return a started :class:`formasaurus.watcher.ModelWatcher`;
+    call its ``stop`` method to stop watching.
+    """
+    from formasaurus.watcher import ModelWatcher
+    get_instance()
+    watcher = ModelWatcher(interval=interval, on_reload=_set_instance,
+                           thread_safe=True)
+    return watcher.start()
+
+
+def _set_instance(classifier):
+    global _form_field_classifier
+    with _lock:
+        _form_field_classifier = classifier
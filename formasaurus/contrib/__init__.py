@@ -0,0 +1,5 @@
+# -*- coding: utf-8 -*-
+"""
+Integrations with third-party libraries. Their dependencies are optional;
+they are not installed together with Formasaurus.
+"""
@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+"""
+Scrapy_ integration.
+
+.. _Scrapy: https://scrapy.org
+
+:class:`FormasaurusMiddleware` is a downloader middleware which classifies
+forms in HTML responses outside of the Twisted reactor thread and stores
+the results in ``response.meta['formasaurus_forms']`` - a list of
+``(form_element, form_info)`` tuples, like :func:`formasaurus.extract_forms`
+returns. Enable it in project or spider settings::
+
+    DOWNLOADER_MIDDLEWARES = {
+        'formasaurus.contrib.scrapy.FormasaurusMiddleware': 950,
+    }
+
+Settings (use ``custom_settings`` spider attribute to set them
+per spider):
+
+* ``FORMASAURUS_ENABLED`` - set it to False to disable the middleware
+  (default: True);
+* ``FORMASAURUS_EXECUTOR`` - 'thread' (default) to classify forms in
+  the reactor thread pool, 'process' to use a process pool, or 'inline'
+  to classify forms in the reactor thread;
+* ``FORMASAURUS_WORKERS`` - number of processes in a process pool
+  (default: number of CPUs);
+* ``FORMASAURUS_CONCURRENCY`` - maximum number of responses
+  processed at the same time (default: 4);
+* ``FORMASAURUS_MAX_BODY_SIZE`` - larger responses are not processed;
+  0 means "no limit" (default: 5MB);
+* ``FORMASAURUS_PROBA``, ``FORMASAURUS_THRESHOLD``, ``FORMASAURUS_FIELDS`` -
+  ``proba``, ``threshold`` and ``fields`` arguments of
+  :func:`formasaurus.extract_forms` (defaults: False, 0.05, True);
+* ``FORMASAURUS_MAX_FORMS``, ``FORMASAURUS_MAX_FIELDS_PER_FORM``,
+  ``FORMASAURUS_MAX_OPTIONS_PER_SELECT``, ``FORMASAURUS_TIMEOUT`` -
+  per-page work budgets, see :meth:`.FormFieldClassifier.extract_forms`
+  (not set by default);
+* ``FORMASAURUS_MODEL`` - path to a model file (default model is used
+  if it is not set).
+
+Set ``request.meta['formasaurus']`` to False to skip a response.
+
+:func:`extract_forms` helper can be used in spider callbacks directly.
+"""
+from __future__ import absolute_import
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from scrapy.http import HtmlResponse
+from twisted.internet import defer, threads
+
+from formasaurus import classifiers, aio
+from formasaurus.html import load_html
+
+try:
+    from scrapy.utils.defer import maybe_deferred_to_future
+except ImportError:  # Scrapy < 2.6
+    def maybe_deferred_to_future(d):
+        return d
+
+
+def extract_forms(response, proba=False, threshold=0.05, fields=True,
+                  classifier=None, **budget):
+    """
+    Return :func:`formasaurus.extract_forms` result for a Scrapy response.
+    Response body is parsed using response encoding, without decoding
+    it to unicode first. This function blocks; in spider callbacks wrap
+    it using ``twisted.internet.threads.deferToThread``,
+    or use :class:`FormasaurusMiddleware`. Keyword arguments
+    (``max_forms``, ``timeout``, etc.) are passed to
+    :meth:`.FormFieldClassifier.extract_forms`.
+    """
+    if classifier is None:
+        classifier = classifiers.get_instance()
+    tree = load_html(response.body, base_url=response.url,
+                     encoding=response.encoding)
+    return classifier.extract_forms(tree, proba=proba, threshold=threshold,
+                                    fields=fields, **budget)
+
+
+class FormasaurusMiddleware(object):
+    """
+    Downloader middleware which classifies forms in HTML responses.
+    See :mod:`formasaurus.contrib.scrapy` for settings.
+    """
+    META_KEY = 'formasaurus_forms'
+
+    def __init__(self, settings):
+        self.executor_type = settings.get('FORMASAURUS_EXECUTOR', 'thread')
+        if self.executor_type not in {'thread', 'process', 'inline'}:
+            raise ValueError("Unknown FORMASAURUS_EXECUTOR: %r"
+                             % self.executor_type)
+        self.max_body_size = settings.getint('FORMASAURUS_MAX_BODY_SIZE',
+                                             5 * 1024 * 1024)
+        self.kwargs = dict(
+            proba=settings.getbool('FORMASAURUS_PROBA', False),
+            threshold=settings.getfloat('FORMASAURUS_THRESHOLD', 0.05),
+            fields=settings.getbool('FORMASAURUS_FIELDS', True),
+            max_forms=_getint_or_none(settings, 'FORMASAURUS_MAX_FORMS'),
+            max_fields_per_form=_getint_or_none(
+                settings, 'FORMASAURUS_MAX_FIELDS_PER_FORM'),
+            max_options_per_select=_getint_or_none(
+                settings, 'FORMASAURUS_MAX_OPTIONS_PER_SELECT'),
+            timeout=_getfloat_or_none(settings, 'FORMASAURUS_TIMEOUT'),
+        )
+        self.semaphore = defer.DeferredSemaphore(
+            settings.getint('FORMASAURUS_CONCURRENCY', 4))
+        model_path = settings.get('FORMASAURUS_MODEL')
+
+        self.classifier = None
+        self.process_pool = None
+        if self.executor_type == 'process':
+            self.process_pool = aio.process_executor(
+                max_workers=settings.getint('FORMASAURUS_WORKERS') or None,
+                model_path=model_path,
+            )
+        elif model_path:
+            self.classifier = classifiers.FormFieldClassifier.load(
+                model_path, thread_safe=True)
+        else:
+            self.classifier = classifiers.get_instance()
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool('FORMASAURUS_ENABLED', True):
+            raise NotConfigured()
+        mw = cls(crawler.settings)
+        crawler.signals.connect(mw.spider_closed, signals.spider_closed)
+        return mw
+
+    def spider_closed(self):
+        if self.process_pool is not None:
+            self.process_pool.shutdown(wait=False)
+
+    async def process_response(self, request, response, spider=None):
+        if not self._should_process(request, response):
+            return response
+        d = self.semaphore.run(self._extract_forms, response)
+        # response.meta is request.meta, but response.request is not set
+        # in downloader middlewares
+        request.meta[self.META_KEY] = await maybe_deferred_to_future(d)
+        return response
+
+    def _should_process(self, request, response):
+        if not isinstance(response, HtmlResponse):
+            return False
+        if not request.meta.get('formasaurus', True):
+            return False
+        if self.max_body_size and len(response.body) > self.max_body_size:
+            return False
+        return True
+
+    def _extract_forms(self, response):
+        if self.executor_type == 'inline':
+            return defer.succeed(extract_forms(response,
+                                               classifier=self.classifier,
+                                               **self.kwargs))
+        if self.executor_type == 'thread':
+            return threads.deferToThread(extract_forms, response,
+                                         classifier=self.classifier,
+                                         **self.kwargs)
+        future = self.process_pool.submit(aio.extract_forms_in_worker,
+                                          response.body, self.kwargs,
+                                          response.encoding)
+        d = _deferred_from_future(future)
+        d.addCallback(aio.parse_worker_forms)
+        return d
+
+
+def _getint_or_none(settings, name):
+    if settings.get(name) is None:
+        return None
+    return settings.getint(name)
+
+
+def _getfloat_or_none(settings, name):
+    if settings.get(name) is None:
+        return None
+    return settings.getfloat(name)
+
+
+def _deferred_from_future(future):
+    """
+    Return a Deferred which fires with a result of
+    ``concurrent.futures.Future``. The Deferred is fired
+    in the reactor thread.
+    """
+    # reactor is not imported at module level:
+    # Scrapy may need to install a different reactor
+    from twisted.internet import reactor
+    d = defer.Deferred()
+
+    def done(future):
+        if future.cancelled():
+            reactor.callFromThread(d.cancel)
+        elif future.exception() is not None:
+            reactor.callFromThread(d.errback, future.exception())
+        else:
+            reactor.callFromThread(d.callback, future.result())
+
+    future.add_done_callback(done)
+    return d
@@ -25,14 +25,20 @@ and then for each fold we predict its labels using form type detector
 trained on the rest 9 folds.
 """
 from __future__ import absolute_import, division
+import os
+import time
 import warnings
+import itertools
 
 import scipy.stats
 import numpy as np
+import pycrfsuite
+from sklearn.base import clone
 from sklearn.metrics import make_scorer
 from sklearn.model_selection import (
     cross_val_predict,
     GroupKFold,
+    GroupShuffleSplit,
     RandomizedSearchCV
 )
 from sklearn_crfsuite import CRF
@@ -48,12 +54,18 @@ from formasaurus import formtype_model
 from formasaurus.html import get_fields_to_annotate, get_text_around_elems
 from formasaurus.text import (normalize, tokenize, ngrams, number_pattern,
     token_ngrams)
-from formasaurus.utils import get_domain
+from formasaurus.utils import fork_map, iter_chunks, load_model_params
 
 
 scorer = make_scorer(flat_f1_score, average='micro')
 """ Default scorer for grid search. We're optimizing for micro-averaged F1. """
 
+EARLY_STOPPING_PARAMS = {'delta': 5e-3, 'period': 5}
+"""
+L-BFGS stopping criterion used with ``early_stopping=True``: training stops
+when log-likelihood improves by less than 0.5% over the last 5 iterations.
+"""
+
 
 def train(annotations,
           use_precise_form_types=True,
@@ -62,8 +74,25 @@ def train(annotations,
           optimize_hyperparameters_jobs=-1,
           full_form_type_names=False,
           full_field_type_names=True,
-          verbose=True):
-
+          verbose=True,
+          n_jobs=1,
+          early_stopping=False,
+          min_freq=0,
+          min_weight=0):
+    """
+    Train field type detection CRF model.
+
+    Features (e.g. character n-grams) which occur less than ``min_freq``
+    times in training data are not used. If ``min_weight`` is positive,
+    the model is pruned after training (see :func:`prune`).
+
+    If ``early_stopping`` is True, CRFsuite stops training when
+    log-likelihood stops improving (see :data:`EARLY_STOPPING_PARAMS`),
+    usually well before ``max_iterations``; the criterion is used both for
+    hyperparameter search and for the final model.
+    The number of iterations the final model is trained for is stored
+    in its ``n_iter_`` attribute.
+    """
     def log(msg):
         if verbose:
             print(msg)
@@ -93,9 +122,14 @@ def train(annotations,
         annotations=annotations,
         form_types=form_types,
         full_type_names=full_field_type_names,
+        n_jobs=n_jobs,
     )
 
-    crf = get_model(use_precise_form_types)
+    crf = get_model(use_precise_form_types, min_freq=min_freq)
+    groups = [ann.domain for ann in annotations]
+
+    if early_stopping:
+        crf.set_params(**EARLY_STOPPING_PARAMS)
 
     if optimize_hyperparameters_iters != 0:
         if optimize_hyperparameters_iters < 50:
@@ -117,24 +151,164 @@ def train(annotations,
             iid=False,
             scoring=scorer
         )
-        rs.fit(X, y, groups=[get_domain(ann.url) for ann in annotations])
+        rs.fit(X, y, groups=groups)
         crf = rs.best_estimator_
         log("Best hyperparameters: c1={:0.5f}, c2={:0.5f}".format(crf.c1, crf.c2))
     else:
         crf.fit(X, y)
 
+    if min_weight:
+        n_features = len(crf.state_features_)
+        crf = prune(crf, X, y, min_weight)
+        log("Pruned state features: {} -> {}".format(
+            n_features, len(crf.state_features_)))
+
+    crf.n_iter_ = len(crf.training_log_.iterations)
+    if early_stopping:
+        log("Stopped after {} training iterations".format(crf.n_iter_))
+    return crf
+
+
+def prune(crf, X, y, min_weight):
+    """
+    Return a copy of trained ``crf`` model which only uses attributes
+    with at least one state feature weight larger than ``min_weight``
+    by absolute value. The copy is trained on ``(X, y)`` data
+    with other attributes removed, so it is smaller and faster to load.
+
+    Only training data is changed; features of new data don't need
+    pruning, as CRFsuite ignores unknown attributes.
+    """
+    keep = {attr for (attr, label), weight in crf.state_features_.items()
+            if abs(weight) > min_weight}
+    X = [_prune_sequence(xseq, keep) for xseq in X]
+    crf = clone(crf)
+    crf.fit(X, y)
+    return crf
+
+
+def _prune_sequence(xseq, keep):
+    items = pycrfsuite.ItemSequence(xseq).items()
+    return [{attr: value for attr, value in item.items() if attr in keep}
+            for item in items]
+
+
+def tune(annotations, n_splits=5, n_candidates='exhaust', min_iterations=10,
+         n_jobs=-1, random_state=0, verbose=0):
+    """
+    Find ``c1`` and ``c2`` regularization parameters of the default CRF
+    model (which uses precise form types) using successive halving:
+    candidates are first trained for ``min_iterations`` L-BFGS iterations,
+    and only the best of them are trained for more iterations.
+    Cross-validation folds are grouped by domain; features are extracted
+    only once.
+
+    Return a dict with the best parameters; save it using
+    :func:`formasaurus.utils.save_model_params` to make :func:`get_model`
+    use them.
+    """
+    # HalvingRandomSearchCV requires scikit-learn >= 0.24
+    from sklearn.experimental import enable_halving_search_cv
+    from sklearn.model_selection import HalvingRandomSearchCV
+
+    annotations = [a for a in annotations
+                   if a.fields_annotated and a.form_annotated]
+    form_types = [a.type_full for a in annotations]
+    X, y = get_Xy(annotations, form_types, full_type_names=True,
+                  n_jobs=n_jobs)
+    groups = [ann.domain for ann in annotations]
+
+    crf = get_model(use_precise_form_types=True)
+    params_space = {
+        'c1': scipy.stats.expon(scale=0.5),
+        'c2': scipy.stats.expon(scale=0.05),
+    }
+    search = HalvingRandomSearchCV(
+        crf,
+        params_space,
+        n_candidates=n_candidates,
+        resource='max_iterations',
+        min_resources=min_iterations,
+        max_resources=crf.max_iterations,
+        cv=GroupKFold(n_splits=n_splits),
+        scoring=scorer,
+        random_state=random_state,
+        n_jobs=n_jobs,
+        verbose=verbose,
+    )
+    search.fit(X, y, groups=groups)
+    return {'c1': float(search.best_params_['c1']),
+            'c2': float(search.best_params_['c2'])}
+
+
+def train_streaming(annotations, full_form_type_names=False,
+                    full_field_type_names=True, chunk_size=500, n_jobs=1):
+    """
+    Train a CRF model using precise form types on an iterable of
+    annotations which may not fit in memory. Annotations are processed in
+    chunks of ``chunk_size``; only their features are passed to CRFsuite,
+    which stores training data in a compact form, so annotations
+    (and their HTML trees) are released after a chunk is processed.
+    """
+    def iter_xy():
+        for chunk in iter_chunks(annotations, chunk_size):
+            chunk = [a for a in chunk if a.fields_annotated and a.form_annotated]
+            if full_form_type_names:
+                form_types = [a.type_full for a in chunk]
+            else:
+                form_types = [a.type for a in chunk]
+            X, y = get_Xy(chunk, form_types,
+                          full_type_names=full_field_type_names,
+                          n_jobs=n_jobs)
+            del chunk
+            for xseq, yseq in zip(X, y):
+                yield xseq, yseq
+
+    # CRF.fit only iterates over X and y in lockstep
+    xy1, xy2 = itertools.tee(iter_xy())
+    X = (xseq for xseq, yseq in xy1)
+    y = (yseq for xseq, yseq in xy2)
+    crf = get_model(use_precise_form_types=True)
+    crf.fit(X, y)
     return crf
 
 
-def get_Xy(annotations, form_types, full_type_names=False):
+def update(crf, annotations, training_data=None, full_form_type_names=False,
+           full_field_type_names=True, n_jobs=1):
+    """
+    Fit CRF model on ``training_data`` (an ``(X, y)`` tuple, as returned by
+    previous :func:`update` call) extended with new annotations.
+    Precise form types are used. Return ``(crf, training_data)`` tuple.
+
+    CRFsuite can't continue training from existing weights, so a clone
+    of the model is fit on all data (``crf`` itself is not changed),
+    but features are only extracted for the new annotations,
+    and HTML of old annotations is not needed.
+    """
+    annotations = [a for a in annotations
+                   if a.fields_annotated and a.form_annotated]
+    if full_form_type_names:
+        form_types = [a.type_full for a in annotations]
+    else:
+        form_types = [a.type for a in annotations]
+    X_new, y_new = get_Xy(annotations, form_types,
+                          full_type_names=full_field_type_names,
+                          n_jobs=n_jobs)
+    X, y = training_data if training_data is not None else ([], [])
+    X, y = X + X_new, y + y_new
+    crf = clone(crf)
+    crf.fit(X, y)
+    return crf, (X, y)
+
+
+def get_Xy(annotations, form_types, full_type_names=False, n_jobs=1):
     """
     Return training data for field type detection.
+    Features are extracted in ``n_jobs`` processes.
     """
     forms = [a.form for a in annotations]
-    X = [
-        get_form_features(form, form_type)
-        for form, form_type in zip(forms, form_types)
-    ]
+    X = fork_map(_get_form_features_star, zip(forms, form_types),
+                 n_jobs=n_jobs)
     if full_type_names:
         y = [a.field_types_full for a in annotations]
     else:
@@ -142,15 +316,19 @@ def get_Xy(annotations, form_types, full_type_names=False):
     return X, y
 
 
-def get_form_features(form, form_type, field_elems=None):
+def get_form_features(form, form_type, field_elems=None,
+                      max_options_per_select=None):
     """
     Return a list of feature dicts, a dict per visible submittable
-    field in a <form> element.
+    field in a <form> element. Only first ``max_options_per_select``
+    <option> elements of each <select> are used (all options are used
+    if it is None).
     """
     if field_elems is None:
         field_elems = get_fields_to_annotate(form)
     text_before, text_after = get_text_around_elems(form, field_elems)
-    res = [_elem_features(elem) for elem in field_elems]
+    res = [_elem_features(elem, max_options_per_select)
+           for elem in field_elems]
 
     for idx, elem_feat in enumerate(res):
         if idx == 0:
@@ -173,7 +351,11 @@ def get_form_features(form, form_type, field_elems=None):
     return res
 
 
-def _elem_features(elem):
+def _get_form_features_star(args):
+    return get_form_features(*args)
+
+
+def _elem_features(elem, max_options=None):
     elem_name = normalize(elem.name)
     elem_value = _elem_attr(elem, 'value')
     elem_placeholder = _elem_attr(elem, 'placeholder')
@@ -202,8 +384,10 @@ def _elem_features(elem):
         feat['input-type'] = elem.get('type', 'text').lower()
 
     if elem.tag == 'select':
-        feat['option-text'] = [normalize(v) for v in elem.xpath('option//text()')]
-        feat['option-value'] = [normalize(el.get('value', '')) for el in elem.xpath('option')]
+        options = get_select_options(elem, max_options)
+        feat['option-text'] = [normalize(v) for el in options
+                               for v in el.xpath('.//text()')]
+        feat['option-value'] = [normalize(el.get('value', '')) for el in options]
         feat['option-num-pattern'] = list(
             {number_pattern(v) for v in feat['option-text'] + feat['option-value']}
         )
@@ -211,6 +395,35 @@ def _elem_features(elem):
     return feat
 
 
+def predict_marginals(crf, xseq):
+    """
+    Array-backed version of ``crf.predict_marginals_single(xseq)``:
+    return ``(labels, marginals)`` tuple, where ``labels`` is a list
+    of CRF labels and ``marginals`` is a 2D array with label probabilities,
+    a row per ``xseq`` item.
+    """
+    tagger = crf.tagger_
+    labels = tagger.labels()
+    marginals = np.zeros((len(xseq), len(labels)))
+    if len(xseq):
+        tagger.set(xseq)
+        for i in range(len(xseq)):
+            for j, label in enumerate(labels):
+                marginals[i, j] = tagger.marginal(label, i)
+    return labels, marginals
+
+
+def get_select_options(elem, max_options=None):
+    """
+    Return a list of <option> children of a <select> element;
+    at most ``max_options`` options are returned if it is not None.
+    """
+    options = elem.iterchildren('option')
+    if max_options is not None:
+        options = itertools.islice(options, max_options)
+    return list(options)
+
+
 def _elem_attr(elem, attr):
     return normalize(elem.get(attr, ''))
 
@@ -219,30 +432,136 @@ _PRECISE_C1_C2 = 0.1655, 0.0236  # values found by randomized search
 _REALISTIC_C1_C2 = 0.247, 0.032  # values found by randomized search
 
 
-def get_model(use_precise_form_types=True):
-    """ Return default CRF model """
+def get_model(use_precise_form_types=True, max_iterations=100, min_freq=0):
+    """
+    Return default CRF model. When ``use_precise_form_types`` is True,
+    hyperparameters found by :func:`tune` are used, if available.
+    Features which occur less than ``min_freq`` times in training data
+    are ignored.
+    """
     c1, c2 = _PRECISE_C1_C2 if use_precise_form_types else _REALISTIC_C1_C2
+    if use_precise_form_types:
+        params = load_model_params('fields')
+        c1, c2 = params.get('c1', c1), params.get('c2', c2)
     return CRF(
         all_possible_transitions=True,
-        max_iterations=100,
+        max_iterations=max_iterations,
+        min_freq=min_freq,
         c1=c1,
         c2=c2
     )
 
 
-def print_classification_report(annotations, n_splits=10, model=None):
-    """ Evaluate model, print classification report """
+def get_model_stats(crf, X):
+    """
+    Return a dict with size and speed stats of a trained CRF model:
+    number of state features and attributes, model file size (in bytes),
+    model load time and average prediction time per form
+    (in seconds) for forms from ``X``.
+    """
+    filename = crf.modelfile.name
+    start = time.time()
+    tagger = pycrfsuite.Tagger()
+    tagger.open(filename)
+    load_time = time.time() - start
+    tagger.close()
+
+    start = time.time()
+    for xseq in X:
+        crf.predict_marginals_single(xseq)
+    latency = (time.time() - start) / max(len(X), 1)
+
+    return {
+        'n_features': len(crf.state_features_),
+        'n_attributes': len(crf.attributes_),
+        'size': os.path.getsize(filename),
+        'load_time': load_time,
+        'latency': latency,
+    }
+
+
+def print_pruning_report(annotations, min_freqs=(0, 2, 5),
+                         min_weights=(0, 0.01, 0.05, 0.1),
+                         test_size=0.25, n_jobs=1, random_state=0):
+    """
+    Train models with different ``min_freq`` and ``min_weight`` values
+    (see :func:`train`) and print their size, load time and per-form
+    prediction latency together with accuracy on a held-out set
+    (split by domain). Precise form types are used.
+    """
+    annotations = [a for a in annotations
+                   if a.fields_annotated and a.form_annotated]
+    form_types = [a.type for a in annotations]
+    X, y = get_Xy(annotations, form_types, full_type_names=True,
+                  n_jobs=n_jobs)
+    groups = [ann.domain for ann in annotations]
+    split = GroupShuffleSplit(n_splits=1, test_size=test_size,
+                              random_state=random_state)
+    train_idx, test_idx = next(split.split(X, y, groups))
+    X_train, y_train = [X[i] for i in train_idx], [y[i] for i in train_idx]
+    X_test, y_test = [X[i] for i in test_idx], [y[i] for i in test_idx]
+
+    row = "{:>8} {:>10} {:>10} {:>10} {:>10} {:>11} {:>10}"
+    print(row.format("min_freq", "min_weight", "features", "size, KB",
+                     "load, ms", "form, ms", "accuracy"))
+    for min_freq in min_freqs:
+        crf = get_model(use_precise_form_types=True, min_freq=min_freq)
+        crf.fit(X_train, y_train)
+        for min_weight in min_weights:
+            model = prune(crf, X_train, y_train, min_weight) if min_weight else crf
+            stats = get_model_stats(model, X_test)
+            accuracy = flat_accuracy_score(y_test, model.predict(X_test))
+            print(row.format(
+                min_freq,
+                min_weight,
+                stats['n_features'],
+                "{:0.1f}".format(stats['size'] / 1024),
+                "{:0.1f}".format(stats['load_time'] * 1000),
+                "{:0.2f}".format(stats['latency'] * 1000),
+                "{:0.1f}%".format(accuracy * 100),
+            ))
+
+
+def print_classification_report(annotations, n_splits=10, model=None,
+                                form_feature_store=None, n_jobs=-1,
+                                realistic_form_types=None,
+                                early_stopping=False):
+    """
+    Evaluate model, print classification report.
+
+    ``form_feature_store`` is a :class:`formasaurus.formtype_model.FeatureStore`
+    used for computing realistic form type labels. Instead of computing them
+    it is possible to pass ``realistic_form_types`` - a result of
+    ``formtype_model.get_realistic_form_labels(annotations,
+    full_type_names=True)`` call, e.g. predictions computed for form type
+    model evaluation.
+
+    ``n_jobs`` is a number of processes to use for cross-validation.
+
+    If ``early_stopping`` is True, CRF training stops when log-likelihood
+    stops improving (see :data:`EARLY_STOPPING_PARAMS`).
+    """
     if model is None:
         # FIXME: we're overfitting on hyperparameters - they should be chosen
         # using inner cross-validation, not set to fixed values beforehand.
         model = get_model(use_precise_form_types=True)
 
-    annotations = [a for a in annotations if a.fields_annotated]
-    form_types = formtype_model.get_realistic_form_labels(
-        annotations=annotations,
-        n_splits=n_splits,
-        full_type_names=False
-    )
+    if realistic_form_types is not None:
+        form_schema = annotations[0].form_schema
+        annotated = [(a, form_schema.types[tp]) for a, tp
+                     in zip(annotations, realistic_form_types)
+                     if a.fields_annotated]
+        annotations = [a for a, tp in annotated]
+        form_types = np.asarray([tp for a, tp in annotated])
+    else:
+        annotations = [a for a in annotations if a.fields_annotated]
+        form_types = formtype_model.get_realistic_form_labels(
+            annotations=annotations,
+            n_splits=n_splits,
+            full_type_names=False,
+            feature_store=form_feature_store,
+            n_jobs=n_jobs,
+        )
 
     X, y = get_Xy(
         annotations=annotations,
@@ -250,9 +569,11 @@ def print_classification_report(annotations, n_splits=10, model=None):
         full_type_names=True,
     )
     group_kfold = GroupKFold(n_splits=n_splits)
-    groups = [get_domain(ann.url) for ann in annotations]
+    groups = [ann.domain for ann in annotations]
+    if early_stopping:
+        model = clone(model).set_params(**EARLY_STOPPING_PARAMS)
     y_pred = cross_val_predict(model, X, y, cv=group_kfold, groups=groups,
-                               n_jobs=-1)
+                               n_jobs=n_jobs)
 
     all_labels = list(annotations[0].field_schema.types.keys())
     labels = sorted(set(flatten(y_pred)), key=lambda k: all_labels.index(k))
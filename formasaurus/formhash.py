@@ -1,4 +1,5 @@
 # -*- coding: utf-8 -*-
+import hashlib
 from copy import deepcopy
 
 import six
@@ -28,3 +29,11 @@ def get_form_hash(form, only_visible=True):
     # return the whole string as a hash, for easier debugging
     return "\n".join(lines)
 
+
+def get_form_fingerprint(form, only_visible=True):
+    """
+    Return a compact version of :func:`get_form_hash` result:
+    a hex digest which is short enough to be stored in an index.
+    """
+    form_hash = get_form_hash(form, only_visible=only_visible)
+    return hashlib.sha1(form_hash.encode('utf8')).hexdigest()
@@ -4,20 +4,48 @@ This module defines which features and which classifier the default
 form type detection model uses.
 """
 from __future__ import absolute_import, division
+import os
+import copy
+import time
+import pickle
+import shutil
+import hashlib
+import tempfile
+import warnings
 
 import numpy as np
-from sklearn.model_selection import cross_val_predict, GroupKFold
-from sklearn.feature_extraction import DictVectorizer
-from sklearn.feature_extraction.text import CountVectorizer, TfidfVectorizer
+import scipy.sparse
+import scipy.stats
+import joblib
+import lxml.html
+import sklearn
+from sklearn.base import BaseEstimator, TransformerMixin, clone
+from sklearn.model_selection import (
+    cross_val_predict,
+    GroupKFold,
+    GroupShuffleSplit,
+)
+from sklearn.feature_extraction import DictVectorizer, FeatureHasher
+from sklearn.feature_extraction.text import (
+    CountVectorizer,
+    TfidfVectorizer,
+    HashingVectorizer,
+)
 from sklearn.metrics import classification_report, accuracy_score
 from sklearn.pipeline import make_pipeline, FeatureUnion, Pipeline
 from sklearn.linear_model import SGDClassifier, LogisticRegression
 from sklearn.svm import LinearSVC
 
-from formasaurus.utils import get_domain
 from formasaurus import formtype_features as features
+from formasaurus.utils import fork_map, load_model_params
 
 
+FEATURES_VERSION = 1
+"""
+Version of default feature extractors. Increase it when feature extraction
+code changes - this invalidates raw feature caches (see :class:`FeatureStore`).
+"""
+
 # a list of 3-tuples with default features:
 # (feature_name, form_transformer, vectorizer)
 FEATURES = [
@@ -84,6 +112,37 @@ FEATURES = [
 ]
 
 
+HASHING_N_FEATURES = 2 ** 15
+""" Number of hashed features per feature extractor in incremental models """
+
+
+def _get_hashing_vectorizer(vec):
+    """
+    Return a stateless vectorizer which is similar to ``vec``
+    but uses hashing trick, so the feature space doesn't depend
+    on training data.
+    """
+    if isinstance(vec, DictVectorizer):
+        return FeatureHasher(n_features=HASHING_N_FEATURES,
+                             input_type='dict', alternate_sign=False)
+    return HashingVectorizer(
+        n_features=HASHING_N_FEATURES,
+        ngram_range=vec.ngram_range,
+        analyzer=vec.analyzer,
+        stop_words=vec.stop_words,
+        binary=vec.binary,
+        norm='l2' if isinstance(vec, TfidfVectorizer) else None,
+        alternate_sign=False,
+    )
+
+
+# the same as FEATURES, but with hashing vectorizers;
+# they are used by incremental models (see ``get_model(incremental=True)``)
+INCREMENTAL_FEATURES = [
+    (name, fe, _get_hashing_vectorizer(vec)) for name, fe, vec in FEATURES
+]
+
+
 if hasattr(Pipeline, 'get_feature_names'):
     _PipelineWithFeatureNames = Pipeline
 else:
@@ -92,24 +151,200 @@ else:
             return self.steps[-1][1].get_feature_names()
 
 
-def _create_feature_union(features):
+class _RawFeatureColumn(BaseEstimator, TransformerMixin):
+    """
+    Transformer which selects a single column from rows
+    returned by :meth:`FeatureStore.get_raw_features`.
+    """
+    def __init__(self, index):
+        self.index = index
+
+    def fit(self, X, y=None):
+        return self
+
+    def transform(self, X, y=None):
+        return [row[self.index] for row in X]
+
+
+def _create_feature_union(features, precomputed=False, n_jobs=None):
     """
     Create a FeatureUnion.
     Each "feature" is a 3-tuple: (name, feature_extractor, vectorizer).
+    If ``precomputed`` is True then the union expects rows of raw features
+    (see :class:`FeatureStore`) instead of <form> elements.
+    ``n_jobs`` is passed to FeatureUnion; it only can be used with
+    ``precomputed=True`` because lxml elements are not picklable.
+    Vectorizers are cloned, so fitting or changing parameters of a model
+    doesn't affect ``features`` and other models.
     """
     return FeatureUnion([
-        (name, _PipelineWithFeatureNames([('fe', fe), ('vec', vec)]))
-        for name, fe, vec in features
-    ])
+        (name, _PipelineWithFeatureNames([
+            ('fe', _RawFeatureColumn(idx) if precomputed else fe),
+            ('vec', clone(vec))
+        ]))
+        for idx, (name, fe, vec) in enumerate(features)
+    ], n_jobs=n_jobs)
 
 
-def get_model(prob=True):
+def _with_feature_extractors(model):
     """
-    Return a default model.
+    Convert a model trained on raw features (created using
+    ``get_model(precomputed=True)``) to a model which works on <form>
+    elements, by replacing column selectors with feature extractors.
+    Feature extractors are stateless, so the result is the same as if
+    the model was trained on <form> elements.
+    """
+    union = model.steps[0][1]
+    union.n_jobs = None
+    for (name, pipe), (fe_name, fe, vec) in zip(union.transformer_list,
+                                                FEATURES):
+        assert name == fe_name
+        pipe.steps[0] = ('fe', fe)
+    return model
+
+
+class FeatureStore(object):
+    """
+    Cache for raw (non-vectorized) form features, i.e. for outputs
+    of feature extractors from :data:`FEATURES`. Feature extraction
+    is done in Python, so it is costly to repeat it for each
+    cross-validation fold; vectorizers are fit on cached values instead.
+
+    Features are cached per form, by a hash of <form> HTML source
+    (text after the form is not included).
+    If ``path`` is not None, the cache is loaded from this file
+    (if it exists and is created for the current :data:`FEATURES_VERSION`)
+    and :meth:`save` writes the cache to this file.
+    """
+    def __init__(self, path=None):
+        self.path = path
+        self._cache = {}
+        self._changed = False
+        if path is not None and os.path.exists(path):
+            data = joblib.load(path)
+            if data['key'] == self.cache_key:
+                self._cache = data['features']
+
+    @property
+    def cache_key(self):
+        return FEATURES_VERSION, tuple(name for name, fe, vec in FEATURES)
+
+    def get_raw_features(self, forms, n_jobs=1):
+        """
+        Return a list of tuples with raw features, a tuple per form.
+        Tuple elements correspond to feature extractors.
+        Features missing in cache are extracted in ``n_jobs`` processes.
+        """
+        keys = [_get_form_key(form) for form in forms]
+        missing = [(key, form) for key, form in zip(keys, forms)
+                   if key not in self._cache]
+        if missing:
+            rows = fork_map(_get_raw_form_features,
+                            [form for key, form in missing], n_jobs=n_jobs)
+            for (key, form), row in zip(missing, rows):
+                self._cache[key] = row
+            self._changed = True
+        return [self._cache[key] for key in keys]
+
+    def save(self):
+        """ Save the cache to a file, if there are changes """
+        if self.path is None or not self._changed:
+            return
+        data = {'key': self.cache_key, 'features': self._cache}
+        joblib.dump(data, self.path, compress=3)
+        self._changed = False
+
+
+def _get_raw_form_features(form):
+    return tuple(fe.get_form_features(form) for name, fe, vec in FEATURES)
+
+
+def _get_form_key(form):
+    # form features don't depend on the text after the form
+    html = lxml.html.tostring(form, with_tail=False)
+    return hashlib.sha1(html).hexdigest()
+
+
+def train_streaming(iter_chunks, classes, full_type_names=False, n_epochs=5):
+    """
+    Train an incremental form type detection model
+    (see ``get_model(incremental=True)``) on data which may not fit
+    in memory.
+
+    ``iter_chunks`` is a function which returns an iterator over lists
+    of FormAnnotation objects. It is called once: hashed features of each
+    chunk are stored in a temporary folder and reused for the following
+    epochs, so annotations (and their HTML trees) can be released after
+    a chunk is processed. ``classes`` is a list of all possible form types.
+    """
+    model = get_model(incremental=True)
+    union, clf = model.steps[0][1], model.steps[-1][1]
+    classes = np.asarray(sorted(classes))
+    rng = np.random.RandomState(0)
+    tmp_dir = tempfile.mkdtemp(prefix='formasaurus-')
+    try:
+        paths = []
+        for chunk in iter_chunks():
+            X, y = get_Xy(chunk, full_type_names)
+            if not paths:
+                union.fit(X[:1])  # vectorizers are stateless
+            Xt = union.transform(X)
+            path = os.path.join(tmp_dir, "%d.npz" % len(paths))
+            scipy.sparse.save_npz(path, scipy.sparse.csr_matrix(Xt))
+            np.save(path + ".y.npy", y)
+            paths.append(path)
+
+        for epoch in range(n_epochs):
+            for idx in rng.permutation(len(paths)):
+                Xt = scipy.sparse.load_npz(paths[idx])
+                y = np.load(paths[idx] + ".y.npy")
+                perm = rng.permutation(len(y))
+                clf.partial_fit(Xt[perm], y[perm], classes=classes)
+    finally:
+        shutil.rmtree(tmp_dir)
+    return model
+
+
+def _get_sgd_log_loss():
+    version = tuple(int(v) for v in sklearn.__version__.split('.')[:2]
+                    if v.isdigit())
+    return 'log_loss' if version >= (1, 1) else 'log'
+
+_SGD_LOG_LOSS = _get_sgd_log_loss()
+
+
+def get_model(prob=True, precomputed=False, n_jobs=None, incremental=False):
+    """
+    Return a default model. If ``precomputed`` is True, the model
+    expects rows of raw features (see :class:`FeatureStore`)
+    instead of <form> elements; ``n_jobs`` sets the number of processes
+    used to fit vectorizers in this case.
+
+    If ``incremental`` is True, a model which can be updated
+    with new examples is returned (see :func:`update`): it uses hashed
+    features and a linear classifier trained with SGD.
+
+    Hyperparameters found by :func:`tune` are used for the default
+    (``prob=True``, non-incremental) model.
     """
     # XXX: fit_intercept is False for easier model debugging.
     # Intercept is included as a regular feature ("Bias").
 
+    if incremental:
+        clf = SGDClassifier(
+            penalty='elasticnet',
+            loss=_SGD_LOG_LOSS,
+            alpha=0.0001,
+            max_iter=50,
+            tol=None,
+            shuffle=True,
+            random_state=0,
+        )
+        fe = _create_feature_union(INCREMENTAL_FEATURES,
+                                   precomputed=precomputed,
+                                   n_jobs=n_jobs if precomputed else None)
+        return make_pipeline(fe, clf)
+
     if prob:
         # clf = SGDClassifier(
         #     penalty='elasticnet',
@@ -124,16 +359,273 @@ def get_model(prob=True):
     else:
         clf = LinearSVC(C=0.5, random_state=0, fit_intercept=True)
 
-    fe = _create_feature_union(FEATURES)
-    return make_pipeline(fe, clf)
+    fe = _create_feature_union(FEATURES, precomputed=precomputed,
+                               n_jobs=n_jobs if precomputed else None)
+    model = make_pipeline(fe, clf)
+    if prob:
+        _set_tuned_params(model, load_model_params('forms'))
+    return model
 
 
-def train(annotations, model=None, full_type_names=False):
-    """ Train form type detection model on annotation data """
-    if model is None:
-        model = get_model()
+def _set_tuned_params(model, params):
+    known = model.get_params()
+    unknown = sorted(set(params) - set(known))
+    if unknown:
+        warnings.warn("Unknown tuned hyperparameters are ignored: %s. "
+                      "Consider running 'formasaurus tune forms' again."
+                      % ", ".join(unknown))
+    model.set_params(**{k: v for k, v in params.items() if k in known})
+
+
+def tune(annotations, n_splits=5, n_candidates='exhaust', feature_store=None,
+         n_jobs=1, random_state=0, verbose=0):
+    """
+    Find hyperparameters (regularization strength and vectorizer ``min_df``
+    values) of the default form type detection model using successive
+    halving: many candidates are evaluated on a small subset of data,
+    and only the best of them are evaluated on more data.
+    Cross-validation folds are grouped by domain.
+
+    Return a dict with the best parameters; save it using
+    :func:`formasaurus.utils.save_model_params` to make :func:`get_model`
+    use them.
+    """
+    # HalvingRandomSearchCV requires scikit-learn >= 0.24
+    from sklearn.experimental import enable_halving_search_cv
+    from sklearn.model_selection import HalvingRandomSearchCV
+
+    if feature_store is None:
+        feature_store = FeatureStore()
+    X, y = get_Xy(annotations, full_type_names=True)
+    X = feature_store.get_raw_features(X, n_jobs=n_jobs)
+    groups = [ann.domain for ann in annotations]
+
+    params_space = {
+        'logisticregression__C': scipy.stats.reciprocal(0.1, 100),
+    }
+    for name, fe, vec in FEATURES:
+        if isinstance(vec, CountVectorizer):
+            params_space['featureunion__%s__vec__min_df' % name] = [1, 2, 3, 4, 5]
+
+    search = HalvingRandomSearchCV(
+        get_model(precomputed=True),
+        params_space,
+        n_candidates=n_candidates,
+        cv=GroupKFold(n_splits=n_splits),
+        scoring='accuracy',
+        random_state=random_state,
+        n_jobs=n_jobs,
+        verbose=verbose,
+    )
+    with warnings.catch_warnings():
+        # candidates with too high min_df fail on small subsets
+        warnings.simplefilter('ignore', UserWarning)
+        search.fit(X, y, groups=groups)
+    return {k: _to_builtin(v) for k, v in search.best_params_.items()}
+
+
+def _to_builtin(value):
+    """ Convert numpy scalars to Python numbers, for JSON """
+    return value.item() if hasattr(value, 'item') else value
+
+
+def train(annotations, model=None, full_type_names=False,
+          feature_store=None, n_jobs=1, incremental=False):
+    """
+    Train form type detection model on annotation data.
+    If ``feature_store`` (a :class:`FeatureStore` instance) is passed
+    and ``model`` is None, cached raw features are used.
+    ``n_jobs`` is a number of processes to use for feature extraction
+    and vectorization; -1 means "use all CPUs".
+    If ``incremental`` is True and ``model`` is None, the model can be
+    updated later using :func:`update`.
+    """
+    X, y = get_Xy(annotations, full_type_names)
+    if model is not None:
+        return model.fit(X, y)
+    if feature_store is None:
+        if n_jobs == 1:
+            return get_model(incremental=incremental).fit(X, y)
+        feature_store = FeatureStore()
+    model = get_model(precomputed=True, n_jobs=n_jobs, incremental=incremental)
+    model.fit(feature_store.get_raw_features(X, n_jobs=n_jobs), y)
+    return _with_feature_extractors(model)
+
+
+def update(model, annotations, full_type_names=False, n_epochs=5):
+    """
+    Update an incremental model (see ``get_model(incremental=True)``)
+    using new annotations, without retraining it from scratch.
+    ``n_epochs`` is a number of passes over the new annotations.
+    Only form types the model was trained on are supported.
+    """
+    union, clf = model.steps[0][1], model.steps[-1][1]
+    if not hasattr(clf, 'partial_fit'):
+        raise ValueError("Model can't be updated; train it "
+                         "with incremental=True option.")
     X, y = get_Xy(annotations, full_type_names)
-    return model.fit(X, y)
+    unknown = set(y) - set(clf.classes_)
+    if unknown:
+        raise ValueError("Unknown form types: %s. Retrain the model to "
+                         "support them." % ", ".join(sorted(unknown)))
+    Xt = union.transform(X)
+    rng = np.random.RandomState(0)
+    for epoch in range(n_epochs):
+        idx = rng.permutation(len(y))
+        clf.partial_fit(Xt[idx], y[idx])
+    return model
+
+
+class _QuantizedLogisticRegression(LogisticRegression):
+    """
+    LogisticRegression which stores coefficients as int8 values
+    with a per-class float32 scale. ``coef_`` is dequantized once,
+    on first access, so prediction code of LogisticRegression works
+    as usual; the dequantized copy is not pickled.
+    """
+    @property
+    def coef_(self):
+        coef = self.__dict__.get('_coef')
+        if coef is None:
+            coef = self.coef_int8_.astype(np.float32)
+            coef *= self.coef_scale_[:, None]
+            self._coef = coef
+        return coef
+
+    def __getstate__(self):
+        state = super(_QuantizedLogisticRegression, self).__getstate__()
+        state.pop('_coef', None)
+        return state
+
+    @classmethod
+    def from_estimator(cls, clf):
+        res = cls.__new__(cls)
+        state = clf.__dict__.copy()
+        coef = state.pop('coef_')
+        scale = np.abs(coef).max(axis=1) / 127
+        scale[scale == 0] = 1
+        state['coef_scale_'] = scale.astype(np.float32)
+        state['coef_int8_'] = np.round(coef / scale[:, None]).astype(np.int8)
+        res.__dict__.update(state)
+        return res
+
+
+def slim(model, min_weight=1e-2, dtype='float32'):
+    """
+    Return a copy of a trained default form type detection model
+    (a model created by ``get_model()``) which uses less memory and
+    loads faster. Vocabulary entries of vectorizers with absolute
+    coefficients below ``min_weight`` in every class are removed
+    (together with their coefficients), and coefficients are stored
+    as ``dtype``: 'float64' (no change), 'float32' or 'int8'
+    (with a per-class scale).
+
+    Predicted probabilities change slightly: besides rounding,
+    removed terms no longer affect tf-idf vector normalization.
+    Use :func:`print_slimming_report` to check the effect.
+    """
+    if dtype not in {'float64', 'float32', 'int8'}:
+        raise ValueError("Unsupported dtype: %r" % dtype)
+    model = copy.deepcopy(model)
+    union, clf = model.steps[0][1], model.steps[-1][1]
+    if not isinstance(clf, LogisticRegression):
+        raise ValueError("Only LogisticRegression models can be slimmed")
+
+    coef = clf.coef_
+    important = np.abs(coef).max(axis=0) >= min_weight
+    keep_columns = []
+    offset = 0
+    for name, pipe in union.transformer_list:
+        vec = pipe.steps[-1][1]
+        n_columns = len(vec.vocabulary_)
+        keep = np.flatnonzero(important[offset:offset + n_columns])
+        _prune_vocabulary(vec, keep)
+        keep_columns.append(keep + offset)
+        offset += n_columns
+    assert offset == coef.shape[1]
+    clf.coef_ = coef[:, np.concatenate(keep_columns)]
+    if hasattr(clf, 'n_features_in_'):
+        clf.n_features_in_ = clf.coef_.shape[1]
+
+    if dtype == 'float32':
+        clf.coef_ = clf.coef_.astype(np.float32)
+        clf.intercept_ = clf.intercept_.astype(np.float32)
+    elif dtype == 'int8':
+        clf = _QuantizedLogisticRegression.from_estimator(clf)
+        clf.intercept_ = clf.intercept_.astype(np.float32)
+        model.steps[-1] = (model.steps[-1][0], clf)
+    return model
+
+
+def _prune_vocabulary(vec, keep):
+    """
+    Only keep features with ``keep`` indices in a fitted DictVectorizer,
+    CountVectorizer or TfidfVectorizer; their order is preserved.
+    """
+    index = {old: new for new, old in enumerate(keep)}
+    vec.vocabulary_ = {term: index[idx] for term, idx in vec.vocabulary_.items()
+                       if idx in index}
+    if isinstance(vec, DictVectorizer):
+        vec.feature_names_ = [vec.feature_names_[idx] for idx in keep]
+    if isinstance(vec, TfidfVectorizer):
+        vec.idf_ = vec.idf_[keep]
+        if hasattr(vec._tfidf, 'n_features_in_'):
+            vec._tfidf.n_features_in_ = len(keep)
+    if hasattr(vec, 'stop_words_'):
+        # it is only kept for introspection, and it can be large
+        vec.stop_words_ = None
+
+
+def print_slimming_report(annotations, min_weights=(0, 1e-2, 0.05, 0.1, 0.2),
+                          dtypes=('float64', 'float32', 'int8'),
+                          test_size=0.25, feature_store=None, n_jobs=1,
+                          random_state=0):
+    """
+    Train a default model on a part of data (split by domain) and print
+    a number of vocabulary entries, pickled size, load time, accuracy
+    on the rest of data and max/mean absolute difference of predicted
+    probabilities for models slimmed (see :func:`slim`) with different
+    ``min_weight`` and ``dtype`` values.
+    """
+    if feature_store is None:
+        feature_store = FeatureStore()
+    X, y = get_Xy(annotations, full_type_names=True)
+    X = feature_store.get_raw_features(X, n_jobs=n_jobs)
+    y = np.asarray(y)
+    groups = [ann.domain for ann in annotations]
+    split = GroupShuffleSplit(n_splits=1, test_size=test_size,
+                              random_state=random_state)
+    train_idx, test_idx = next(split.split(X, y, groups))
+    X_train, X_test = [X[i] for i in train_idx], [X[i] for i in test_idx]
+
+    model = get_model(precomputed=True)
+    model.fit(X_train, y[train_idx])
+    model.steps[0][1].n_jobs = None
+    probs = model.predict_proba(X_test)
+
+    row = "{:>10} {:>7} {:>8} {:>10} {:>9} {:>9} {:>12}"
+    print(row.format("min_weight", "dtype", "terms", "size, KB",
+                     "load, ms", "accuracy", "prob. diff"))
+    for min_weight in min_weights:
+        for dtype in dtypes:
+            slimmed = slim(model, min_weight=min_weight, dtype=dtype)
+            data = pickle.dumps(slimmed, protocol=pickle.HIGHEST_PROTOCOL)
+            start = time.time()
+            pickle.loads(data)
+            load_time = time.time() - start
+            n_terms = sum(len(pipe.steps[-1][1].vocabulary_)
+                          for name, pipe in slimmed.steps[0][1].transformer_list)
+            diff = np.abs(slimmed.predict_proba(X_test) - probs)
+            print(row.format(
+                min_weight,
+                dtype,
+                n_terms,
+                "{:0.1f}".format(len(data) / 1024),
+                "{:0.1f}".format(load_time * 1000),
+                "{:0.1f}%".format(accuracy_score(y[test_idx],
+                                                 slimmed.predict(X_test)) * 100),
+                "{:0.4f}/{:0.4f}".format(diff.max(), diff.mean()),
+            ))
 
 
 def get_Xy(annotations, full_type_names):
@@ -148,31 +640,53 @@ def get_Xy(annotations, full_type_names):
 
 
 def get_realistic_form_labels(annotations, n_splits=10, model=None,
-                              full_type_names=True):
+                              full_type_names=True, feature_store=None,
+                              n_jobs=1):
     """
     Return form type labels which form type detection model
     is likely to produce.
-    """
-    if model is None:
-        model = get_model()
 
+    When ``model`` is None, raw features are extracted only once
+    (using ``feature_store`` if it is passed), not for each fold, and
+    cross-validation folds are processed in ``n_jobs`` processes.
+    A custom ``model`` is trained on <form> elements, which are not
+    picklable, so folds are processed sequentially in this case.
+    """
     X, y = get_Xy(annotations, full_type_names)
+    if model is None:
+        if feature_store is None:
+            feature_store = FeatureStore()
+        model = get_model(precomputed=True)
+        X = feature_store.get_raw_features(X, n_jobs=n_jobs)
+    else:
+        n_jobs = 1
     group_kfold = GroupKFold(n_splits=n_splits)
-    groups = [get_domain(ann.url) for ann in annotations]
-    return cross_val_predict(model, X, y, cv=group_kfold, groups=groups)
+    groups = [ann.domain for ann in annotations]
+    return cross_val_predict(model, X, y, cv=group_kfold, groups=groups,
+                             n_jobs=n_jobs)
 
 
-def print_classification_report(annotations, n_splits=10, model=None):
-    """ Evaluate model, print classification report """
-    if model is None:
+def print_classification_report(annotations, n_splits=10, model=None,
+                                feature_store=None, n_jobs=1,
+                                y_pred=None):
+    """
+    Evaluate model, print classification report.
+    Pass ``y_pred`` to use precomputed
+    ``get_realistic_form_labels(annotations, full_type_names=True)`` result
+    instead of running cross-validation. Return predicted labels.
+    """
+    if y_pred is None:
         # FIXME: we're overfitting on hyperparameters - they should be chosen
         # using inner cross-validation, not set to fixed values beforehand.
-        model = get_model()
-
+        y_pred = get_realistic_form_labels(
+            annotations=annotations,
+            n_splits=n_splits,
+            model=model,
+            full_type_names=True,
+            feature_store=feature_store,
+            n_jobs=n_jobs,
+        )
     X, y = get_Xy(annotations, full_type_names=True)
-    group_kfold = GroupKFold(n_splits=n_splits)
-    groups = [get_domain(ann.url) for ann in annotations]
-    y_pred = cross_val_predict(model, X, y, cv=group_kfold, groups=groups)
 
     # hack to format report nicely
     all_labels = list(annotations[0].form_schema.types.keys())
@@ -183,3 +697,4 @@ def print_classification_report(annotations, n_splits=10, model=None):
     print("{:0.1f}% forms are classified correctly.".format(
         accuracy_score(y, y_pred) * 100
     ))
+    return y_pred
@@ -26,12 +26,13 @@ def remove_by_xpath(tree, xpath):
 
 
 parser = lxml.html.HTMLParser(encoding='utf8')
+_parsers = {'utf8': parser}
 
-def load_html(tree_or_html, base_url=None):
+def load_html(tree_or_html, base_url=None, encoding=None):
     """
     Parse HTML data to a lxml tree.
-    ``tree_or_html`` must be either unicode or utf8-encoded
-    (even if original page declares a different encoding).
+    ``tree_or_html`` must be either unicode or encoded using ``encoding``
+    (utf8 by default, even if original page declares a different encoding).
 
     If ``tree_or_html`` is not a string then it is returned as-is.
     """
@@ -41,9 +42,26 @@ def load_html(tree_or_html, base_url=None):
     html = tree_or_html
     if isinstance(html, six.text_type):
         html = html.encode('utf8')
+    elif encoding is not None:
+        html_parser = _get_parser(encoding)
+        if html_parser is None:
+            # encoding is not supported by libxml2
+            html = html.decode(encoding, 'replace').encode('utf8')
+        else:
+            return lxml.html.fromstring(html, base_url=base_url,
+                                        parser=html_parser)
     return lxml.html.fromstring(html, base_url=base_url, parser=parser)
 
 
+def _get_parser(encoding):
+    if encoding not in _parsers:
+        try:
+            _parsers[encoding] = lxml.html.HTMLParser(encoding=encoding)
+        except LookupError:
+            _parsers[encoding] = None
+    return _parsers[encoding]
+
+
 def html_tostring(tree):
     return lxml.html.tostring(tree, pretty_print=True, encoding='unicode')
 
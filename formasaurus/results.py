@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+"""
+Compact, array-backed classification results.
+
+:class:`FormProba` is returned by ``classify_proba(..., compact=True)``
+and ``extract_forms(..., proba=True, compact=True)``. Instead of building
+a ``{class: probability}`` dict for a form and for each of its fields,
+it keeps probability arrays and shares class name lists with the model;
+dict-like views are created only when they are accessed::
+
+    >>> import numpy as np
+    >>> res = FormProba(('login', 'search'), np.array([0.9, 0.1]),
+    ...                 field_names=['q'], field_classes=('password', 'query'),
+    ...                 field_probs=np.array([[0.2, 0.8]]), threshold=0.15)
+    >>> res.argmax
+    'login'
+    >>> dict(res.form)
+    {'login': 0.9}
+    >>> res.field_argmax
+    {'q': 'query'}
+    >>> res.field_top_k('q', 1)
+    [('query', 0.8)]
+    >>> res.to_dict() == {'form': {'login': 0.9},
+    ...                   'fields': {'q': {'password': 0.2, 'query': 0.8}}}
+    True
+"""
+from __future__ import absolute_import
+
+import numpy as np
+
+try:
+    from collections.abc import Mapping
+except ImportError:  # Python 2
+    from collections import Mapping
+
+
+class ProbaView(Mapping):
+    """
+    Read-only ``{class: probability}`` mapping backed by an array
+    of probabilities. Classes with probability less than ``threshold``
+    are not included.
+    """
+    __slots__ = ('classes', 'probs', 'threshold')
+
+    def __init__(self, classes, probs, threshold=0.0):
+        self.classes = classes
+        self.probs = probs
+        self.threshold = threshold
+
+    def __getitem__(self, cls):
+        for idx, name in enumerate(self.classes):
+            if name == cls:
+                break
+        else:
+            raise KeyError(cls)
+        prob = float(self.probs[idx])
+        if prob < self.threshold:
+            raise KeyError(cls)
+        return prob
+
+    def __iter__(self):
+        for idx in np.flatnonzero(self.probs >= self.threshold):
+            yield self.classes[idx]
+
+    def __len__(self):
+        return int(np.count_nonzero(self.probs >= self.threshold))
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class _FieldsView(Mapping):
+    """
+    Read-only ``{field name: ProbaView}`` mapping for :class:`FormProba`.
+    """
+    __slots__ = ('result',)
+
+    def __init__(self, result):
+        self.result = result
+
+    def __getitem__(self, name):
+        idx = self.result._get_field_index()[name]
+        return ProbaView(self.result.field_classes,
+                         self.result.field_probs[idx],
+                         self.result.threshold)
+
+    def __iter__(self):
+        return iter(self.result._get_field_index())
+
+    def __len__(self):
+        return len(self.result._get_field_index())
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class FormProba(object):
+    """
+    Probabilities of a form and its fields belonging to various
+    form and field classes.
+
+    * ``form_classes`` - form class names;
+    * ``form_probs`` - 1D array with form class probabilities;
+    * ``field_names`` - names of classified fields
+      (None if fields were not classified);
+    * ``field_classes`` - field class names;
+    * ``field_probs`` - 2D array with field class probabilities,
+      a row per field;
+    * ``threshold`` - minimum probability of classes
+      included in dict views;
+    * ``truncated`` - True if some fields or options were skipped because
+      of work budgets (see :meth:`.FormFieldClassifier.classify`).
+
+    :attr:`form` and :attr:`fields` are lazy dict-like views
+    which mirror :meth:`.FormFieldClassifier.classify_proba` results;
+    use :meth:`to_dict` to get a regular dict.
+    """
+    __slots__ = ('form_classes', 'form_probs', 'field_names', 'field_classes',
+                 'field_probs', 'threshold', 'truncated', '_field_index')
+
+    def __init__(self, form_classes, form_probs, field_names=None,
+                 field_classes=None, field_probs=None, threshold=0.0,
+                 truncated=False):
+        self.form_classes = form_classes
+        self.form_probs = form_probs
+        self.field_names = field_names
+        self.field_classes = field_classes
+        self.field_probs = field_probs
+        self.threshold = threshold
+        self.truncated = truncated
+        self._field_index = None
+
+    def __getstate__(self):
+        return {name: getattr(self, name) for name in self.__slots__
+                if name != '_field_index'}
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+        self._field_index = None
+
+    @property
+    def form(self):
+        """ ``{form class: probability}`` view """
+        return ProbaView(self.form_classes, self.form_probs, self.threshold)
+
+    @property
+    def fields(self):
+        """
+        ``{field name: {field class: probability}}`` view,
+        or None if fields were not classified.
+        """
+        if self.field_names is None:
+            return None
+        return _FieldsView(self)
+
+    @property
+    def argmax(self):
+        """ The most likely form class """
+        return self.form_classes[int(np.argmax(self.form_probs))]
+
+    def top_k(self, k=3):
+        """
+        Return a list of ``(form class, probability)`` tuples
+        for ``k`` most likely form classes.
+        """
+        return _top_k(self.form_classes, self.form_probs, k)
+
+    @property
+    def field_argmax(self):
+        """ ``{field name: the most likely field class}`` dict """
+        if self.field_names is None:
+            return None
+        idx = np.argmax(self.field_probs, axis=1)
+        return {name: self.field_classes[i]
+                for name, i in zip(self.field_names, idx)}
+
+    def field_top_k(self, name, k=3):
+        """
+        Return a list of ``(field class, probability)`` tuples
+        for ``k`` most likely classes of a field named ``name``.
+        """
+        idx = self._get_field_index()[name]
+        return _top_k(self.field_classes, self.field_probs[idx], k)
+
+    def to_dict(self):
+        """
+        Return a dict in :meth:`.FormFieldClassifier.classify_proba`
+        format.
+        """
+        res = {'form': dict(self.form)}
+        if self.field_names is not None:
+            res['fields'] = {name: dict(view)
+                             for name, view in self.fields.items()}
+        if self.truncated:
+            res['truncated'] = True
+        return res
+
+    def _get_field_index(self):
+        # like a dict comprehension, the last field with a given name wins
+        if self._field_index is None:
+            self._field_index = {name: idx for idx, name
+                                 in enumerate(self.field_names)}
+        return self._field_index
+
+    def __repr__(self):
+        return "%s(%r)" % (self.__class__.__name__, self.to_dict())
+
+
+def _top_k(classes, probs, k):
+    idx = np.argsort(-probs, kind='mergesort')[:k]
+    return [(classes[i], float(probs[i])) for i in idx]
@@ -0,0 +1,329 @@
+# -*- coding: utf-8 -*-
+"""
+HTTP service which classifies forms and their fields.
+
+The model is loaded once, before the service starts accepting connections
+(or in background, if ``background=True`` is passed to :func:`make_server`);
+with several workers it is loaded in the main process and shared by
+forked worker processes.
+
+Endpoints:
+
+* ``POST /extract-forms`` - request body is a JSON object
+  ``{"html": "<html>...", "threshold": 0.05, "fields": true}``
+  (only "html" is required); response is
+  ``{"forms": [{"form": {...}, "fields": {...}}, ...]}`` with
+  probabilities, like :func:`formasaurus.classify_proba` results,
+  for each form on the page.
+* ``POST /extract-forms/batch`` - request body is
+  ``{"pages": [{"html": "..."}, ...], "threshold": 0.05, "fields": true}``;
+  response is ``{"results": [{"forms": [...]}, ...]}``, a result per page;
+  if a page can't be processed, its result is ``{"error": "..."}``.
+* Invalid requests get 400 responses, and unexpected errors get
+  500 responses; error responses are ``{"error": "..."}`` JSON objects.
+* ``GET /health`` - returns 200 while the service is running;
+* ``GET /ready`` - returns 200 when the model is loaded and the service
+  can classify forms, 503 otherwise (``{"status": "loading"}`` while
+  the model is loading in background, or ``{"status": "error",
+  "error": "..."}`` if it can't be loaded).
+"""
+from __future__ import absolute_import, print_function
+import os
+import sys
+import json
+import signal
+import numbers
+
+import six
+import lxml.etree
+from six.moves import BaseHTTPServer
+
+from formasaurus.classifiers import FormFieldClassifier
+from formasaurus.watcher import ModelWatcher
+from formasaurus.html import load_html
+from formasaurus.utils import get_n_jobs, freeze_gc
+
+
+MAX_REQUEST_SIZE = 50 * 1024 * 1024
+""" Maximum size of a request body, in bytes """
+
+
+class _BadRequest(Exception):
+    def __init__(self, message, status=400):
+        super(_BadRequest, self).__init__(message)
+        self.status = status
+
+
+class FormasaurusServer(BaseHTTPServer.HTTPServer):
+    """
+    HTTP server which classifies forms using ``classifier``
+    (a :class:`~.FormFieldClassifier` instance).
+    See :func:`make_server`.
+    """
+    def __init__(self, server_address, classifier, threshold=0.05,
+                 verbose=False):
+        self.classifier = classifier
+        self.load_error = None
+        self.threshold = threshold
+        self.verbose = verbose
+        BaseHTTPServer.HTTPServer.__init__(self, server_address,
+                                           _RequestHandler)
+
+    @property
+    def ready(self):
+        return self.classifier is not None
+
+    def set_classifier_future(self, future):
+        """
+        Use a classifier from ``future`` (e.g. returned by
+        :meth:`FormFieldClassifier.load_async`) when it is resolved;
+        until then the server is not ready.
+        """
+        def done(future):
+            error = future.exception()
+            if error is not None:
+                self.load_error = error
+                if self.verbose:
+                    print("Model loading failed: %s" % error, file=sys.stderr)
+            elif self.classifier is None:
+                self.classifier = future.result()
+        future.add_done_callback(done)
+
+    def watch_model(self, interval, model_path=None):
+        """
+        Start reloading the model from ``model_path`` (the default
+        model file if it is None) when the file changes; return
+        a started :class:`~.ModelWatcher`. Requests which are being
+        handled when a new model is loaded finish using the old model.
+        """
+        def on_reload(classifier):
+            self.classifier = classifier
+        watcher = ModelWatcher(model_path, interval=interval,
+                               on_reload=on_reload)
+        return watcher.start()
+
+    def extract_forms(self, page, threshold=None, fields=True):
+        """ Return a JSON-serializable result for a single page """
+        html = _get_html(page)
+        if threshold is None:
+            threshold = self.threshold
+        if not html.strip():
+            return {'forms': []}
+        try:
+            tree = load_html(html)
+        except lxml.etree.ParserError:
+            # e.g. a document with comments only
+            return {'forms': []}
+        forms = self.classifier.extract_forms(tree, proba=True,
+                                              threshold=threshold,
+                                              fields=fields)
+        return {'forms': [info for form, info in forms]}
+
+
+def _get_html(page):
+    if not isinstance(page, dict) or 'html' not in page:
+        raise _BadRequest("'html' is required")
+    if not isinstance(page['html'], six.string_types):
+        raise _BadRequest("'html' must be a string")
+    return page['html']
+
+
+def _check_options(threshold, fields):
+    if threshold is not None and (isinstance(threshold, bool) or
+                                  not isinstance(threshold, numbers.Real)):
+        raise _BadRequest("'threshold' must be a number")
+    if not isinstance(fields, bool):
+        raise _BadRequest("'fields' must be a boolean")
+
+
+def _error_message(e):
+    return "%s: %s" % (type(e).__name__, e)
+
+
+class _RequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    server_version = "Formasaurus"
+
+    def do_GET(self):
+        if self.path == '/health':
+            self._send_json(200, {'status': 'ok'})
+        elif self.path == '/ready':
+            if self.server.ready:
+                self._send_json(200, {'status': 'ready'})
+            elif self.server.load_error is not None:
+                self._send_json(503, {'status': 'error',
+                                      'error': str(self.server.load_error)})
+            else:
+                self._send_json(503, {'status': 'loading'})
+        else:
+            self._send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        try:
+            if self.path not in {'/extract-forms', '/extract-forms/batch'}:
+                raise _BadRequest('not found', status=404)
+            if not self.server.ready:
+                raise _BadRequest('not ready', status=503)
+            data = self._read_json()
+            threshold = data.get('threshold')
+            fields = data.get('fields', True)
+            _check_options(threshold, fields)
+            if self.path == '/extract-forms':
+                _get_html(data)
+                result = self.server.extract_forms(data, threshold, fields)
+            else:
+                pages = data.get('pages')
+                if not isinstance(pages, list):
+                    raise _BadRequest("'pages' must be a list")
+                for page in pages:
+                    _get_html(page)
+                result = {'results': [
+                    self._extract_forms_or_error(page, threshold, fields)
+                    for page in pages
+                ]}
+        except _BadRequest as e:
+            self._send_json(e.status, {'error': str(e)})
+        except Exception as e:
+            self._send_json(500, {'error': _error_message(e)})
+        else:
+            self._send_json(200, result)
+
+    def _extract_forms_or_error(self, page, threshold, fields):
+        # an error in a single page shouldn't fail the whole batch
+        try:
+            return self.server.extract_forms(page, threshold, fields)
+        except Exception as e:
+            return {'error': _error_message(e)}
+
+    def _read_json(self):
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+        except ValueError:
+            raise _BadRequest("invalid Content-Length")
+        if length > MAX_REQUEST_SIZE:
+            raise _BadRequest("request is too large", status=413)
+        body = self.rfile.read(length)
+        try:
+            data = json.loads(body.decode('utf8'))
+        except ValueError:
+            raise _BadRequest("request body is not valid JSON")
+        if not isinstance(data, dict):
+            raise _BadRequest("request body must be a JSON object")
+        return data
+
+    def _send_json(self, status, data):
+        body = json.dumps(data).encode('utf8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            BaseHTTPServer.BaseHTTPRequestHandler.log_message(
+                self, format, *args)
+
+
+def make_server(classifier=None, host='127.0.0.1', port=8080,
+                threshold=0.05, verbose=False, model_path=None,
+                background=False, strict=None):
+    """
+    Load and warm up the model, then return a :class:`FormasaurusServer`
+    bound to ``host`` and ``port``; call its ``serve_forever`` method
+    to start handling requests. If ``classifier`` is None, a model
+    is loaded from ``model_path`` (the default model is used if it is None;
+    see :meth:`FormFieldClassifier.load` for ``strict`` argument).
+    Use ``port=0`` to bind to a free port (check ``server.server_port``).
+
+    If ``background`` is True and ``classifier`` is None, the server
+    is returned immediately, and the model is loaded in a background
+    thread; ``/ready`` endpoint reports when it is loaded.
+    """
+    if classifier is None and background:
+        server = FormasaurusServer((host, port), None, threshold=threshold,
+                                   verbose=verbose)
+        server.set_classifier_future(
+            FormFieldClassifier.load_async(model_path, strict=strict))
+        return server
+    if classifier is None:
+        classifier = FormFieldClassifier.load(model_path, strict=strict)
+    classifier.warmup()
+    return FormasaurusServer((host, port), classifier, threshold=threshold,
+                             verbose=verbose)
+
+
+def serve(classifier=None, host='127.0.0.1', port=8080, workers=1,
+          threshold=0.05, verbose=True, model_path=None, background=False,
+          strict=None, reload_interval=None):
+    """
+    Run the classification service until it is interrupted.
+    Requests are handled by ``workers`` processes (-1 means
+    "a process per CPU") which share the listening socket and the
+    model loaded in the main process.
+
+    See :func:`make_server` for a description of ``model_path``,
+    ``background`` and ``strict`` arguments. Models are loaded in background
+    only by single-process services: with several workers the model
+    must be loaded before workers are started, to share its memory.
+
+    If ``reload_interval`` is set, the model file is checked every
+    ``reload_interval`` seconds, and the model is reloaded when the file
+    changes (see :meth:`FormasaurusServer.watch_model`). With several
+    workers each worker reloads the model separately, so reloaded models
+    are not shared.
+    """
+    workers = get_n_jobs(workers)
+    background = background and workers == 1
+    if verbose and classifier is None and not background:
+        print("Loading the model...")
+    server = make_server(classifier, host=host, port=port,
+                         threshold=threshold, verbose=verbose,
+                         model_path=model_path, background=background,
+                         strict=strict)
+    if verbose:
+        print("Listening on http://%s:%s/ (%d worker(s))" % (
+            server.server_address[0], server.server_port, workers))
+        sys.stdout.flush()
+
+    if workers == 1 or not hasattr(os, 'fork'):
+        if reload_interval:
+            server.watch_model(reload_interval, model_path)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+        return
+
+    # keep the model memory shared by workers
+    freeze_gc()
+    pids = []
+    for i in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            if reload_interval:
+                server.watch_model(reload_interval, model_path)
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+            finally:
+                os._exit(0)
+        pids.append(pid)
+
+    def stop(signum, frame):
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except OSError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    try:
+        for pid in pids:
+            os.waitpid(pid, 0)
+    except KeyboardInterrupt:
+        stop(None, None)
+    finally:
+        server.server_close()
@@ -3,16 +3,17 @@
 A module for working with annotation data storage.
 """
 from __future__ import absolute_import
+import io
 import os
 import json
-import copy
+import gzip
 import collections
 from six.moves.urllib import parse as urlparse
 
 from tqdm import tqdm
 
 from formasaurus.annotation import AnnotationSchema, FormAnnotation
-from formasaurus.formhash import get_form_hash
+from formasaurus.formhash import get_form_fingerprint
 from formasaurus.utils import get_domain, inverse_mapping
 from formasaurus.html import (
     load_html,
@@ -21,6 +22,26 @@ from formasaurus.html import (
     get_field_names,
 )
 
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+# {compression: file name suffix}
+COMPRESSION_EXTENSIONS = collections.OrderedDict([
+    (None, ''),
+    ('gzip', '.gz'),
+    ('zstd', '.zst'),
+])
+
+# default value of compression arguments which means
+# "use compression method of the storage"
+_DEFAULT = object()
+
+_GZIP_MAGIC = b'\x1f\x8b'
+_ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
 
 class Storage(object):
     """
@@ -37,6 +58,11 @@ class Storage(object):
             ...
 
     ``html`` folders contains raw contents of the webpages.
+    Files can be compressed: ``.html.gz`` files are gzip-compressed,
+    ``.html.zst`` files are zstd-compressed (this requires
+    `zstandard <https://pypi.org/project/zstandard/>`_ package).
+    Compressed files are decoded transparently; compression is detected
+    by magic bytes, so it works regardless of file extension.
     :file:`index.json` file contains a JSON dict with the following records::
 
         "RELATIVE-PATH-TO-HTML-FILE": {
@@ -46,6 +72,7 @@ class Storage(object):
                 {"name1": "type1", "name2": "type2", ...},
                 ...
             ],
+            "fingerprints": ["fingerprint1", "fingerprint2", ...],
         }
 
     Key is the relative path to a file with page contents
@@ -57,13 +84,25 @@ class Storage(object):
     * "visible_html_fields" contains an array of objects, one object per
       ``<form>`` element; each object is a mapping from field name to
       field type identifier.
+    * "fingerprints" (optional) contains an array of form fingerprints
+      (see :meth:`get_fingerprint`), one per ``<form>`` element; they allow
+      to deduplicate forms and count form types without parsing HTML.
+      Use :meth:`reindex` to compute missing fingerprints.
 
     Possible form and field types are stored in :file:`config.json` file;
     you can read them using :meth:`get_form_types` and :meth:`get_field_types`.
     """
 
-    def __init__(self, folder):
+    def __init__(self, folder, compression=None):
+        """
+        ``compression`` is a compression method used for new files:
+        None (default, files are stored uncompressed), 'gzip' or 'zstd'.
+        """
+        _check_compression(compression)
         self.folder = folder
+        self.compression = compression
+        # {path: fingerprints} for files without fingerprints in the index
+        self._fingerprints_cache = {}
 
     def initialize(self, config, index=None):
         """ Create folders and files for a new storage """
@@ -90,6 +129,8 @@ class Storage(object):
                     collections.OrderedDict(sorted(row.items()))
                     for row in info['visible_html_fields']
                 ]
+            if 'fingerprints' in info:
+                index[k]['fingerprints'] = info['fingerprints']
 
         with open(os.path.join(self.folder, "index.json"), "wb") as f:
             data = json.dumps(index, ensure_ascii=True, indent=4)
@@ -132,9 +173,11 @@ class Storage(object):
 
     def add_result(self, html, url, form_answers=None,
                    visible_html_fields=None, index=None,
-                   add_empty=True):
+                   add_empty=True, compression=_DEFAULT):
         """
         Save HTML source and its <form> and form field types.
+        ``compression`` overrides compression method set for the storage
+        (None means "don't compress").
         """
         forms = get_forms(load_html(html))
         if not add_empty:
@@ -157,7 +200,9 @@ class Storage(object):
                 for name in get_field_names(get_fields_to_annotate(form))
             } for form in forms]
 
-        filename = self.generate_filename(url)
+        if compression is _DEFAULT:
+            compression = self.compression
+        filename = self.generate_filename(url, compression)
         path = os.path.relpath(filename, self.folder)
         if index is None:
             index = self.get_index()
@@ -165,11 +210,11 @@ class Storage(object):
             "url": url,
             "forms": form_answers,
             "visible_html_fields": visible_html_fields,
+            "fingerprints": [self.get_fingerprint(form) for form in forms],
         }
-        with open(filename, 'wb') as f:
-            if not isinstance(html, bytes):
-                html = html.encode('utf8')
-            f.write(html)
+        if not isinstance(html, bytes):
+            html = html.encode('utf8')
+        write_html_file(filename, html, compression)
         self.write_index(index)
         return path
 
@@ -188,31 +233,27 @@ class Storage(object):
             trees = tqdm(trees, "Loading", mininterval=0,
                          leave=leave, ascii=True, ncols=80, unit=' files')
 
-        seen = set()
+        accept = _form_type_filter(form_schema, drop_duplicates, drop_na,
+                                   drop_skipped, simplify_form_types)
         for path, tree, info in trees:
+            fingerprints = self._get_known_fingerprints(path, info)
+            page_info = None
             for idx, (form, tp) in enumerate(zip(get_forms(tree), info["forms"])):
-                if simplify_form_types:
-                    tp = form_schema.simplify_map.get(tp, tp)
-
-                if drop_na and tp == form_schema.na_value:
-                    continue
-
-                if drop_skipped and tp == form_schema.skip_value:
+                if fingerprints is not None:
+                    get_fp = lambda: fingerprints[idx]
+                else:
+                    get_fp = lambda: self.get_fingerprint(form)
+                tp = accept(tp, get_fp)
+                if tp is None:
                     continue
 
-                if drop_duplicates:
-                    fp = self.get_fingerprint(form)
-                    if fp in seen:
-                        continue
-                    seen.add(fp)
+                if page_info is None:
+                    # it is shared by all forms from the page
+                    page_info = info
+                    if simplify_field_types:
+                        page_info = _simplify_field_types(info, field_schema)
 
-                if simplify_field_types:
-                    info = copy.deepcopy(info)
-                    for fields in info['visible_html_fields']:
-                        for k, v in fields.items():
-                            fields[k] = field_schema.simplify_map.get(v, v)
-
-                yield FormAnnotation(form, tp, idx, info, path,
+                yield FormAnnotation(form, tp, idx, page_info, path,
                                      form_schema, field_schema)
 
         if verbose and leave:
@@ -226,13 +267,64 @@ class Storage(object):
         """
         if index is None:
             index = self.get_index()
-        sorted_items = sorted(
+        for path, info in self._sorted_items(index):
+            tree = self.get_tree(path, info)
+            yield path, tree, info
+
+    def iter_form_records(self, index=None, drop_duplicates=True,
+                          drop_na=True, drop_skipped=True,
+                          simplify_form_types=False):
+        """
+        Return an iterator over ``(path, form_index, form_type)`` tuples.
+        Forms are filtered the same way as in :meth:`iter_annotations`,
+        but HTML is parsed only for index entries without fingerprints.
+        """
+        form_schema = self.get_form_schema()
+        accept = _form_type_filter(form_schema, drop_duplicates, drop_na,
+                                   drop_skipped, simplify_form_types)
+        forms = self._iter_index_forms(index, with_fingerprints=drop_duplicates)
+        for path, idx, fp, tp in forms:
+            tp = accept(tp, lambda: fp)
+            if tp is not None:
+                yield path, idx, tp
+
+    def _iter_index_forms(self, index=None, with_fingerprints=True):
+        """
+        Return an iterator over ``(path, form_index, fingerprint, form_type)``
+        tuples for all forms in the index, in :meth:`iter_trees` order.
+        If ``with_fingerprints`` is False, fingerprints are None.
+        """
+        if index is None:
+            index = self.get_index()
+        for path, info in self._sorted_items(index):
+            fingerprints = None
+            if with_fingerprints:
+                fingerprints = self._get_known_fingerprints(path, info)
+                if fingerprints is None:
+                    tree = self.get_tree(path, info)
+                    fingerprints = [self.get_fingerprint(form)
+                                    for form in get_forms(tree)]
+                    self._fingerprints_cache[path] = fingerprints
+            if fingerprints is None:
+                fingerprints = [None] * len(info['forms'])
+
+            for idx, (fp, tp) in enumerate(zip(fingerprints, info['forms'])):
+                yield path, idx, fp, tp
+
+    def _get_known_fingerprints(self, path, info):
+        """
+        Return a list of form fingerprints for an index entry if they are
+        stored in the index or cached, None otherwise.
+        """
+        if 'fingerprints' in info:
+            return info['fingerprints']
+        return self._fingerprints_cache.get(path)
+
+    def _sorted_items(self, index):
+        return sorted(
             index.items(),
             key=lambda it: (get_domain(it[1]["url"]), it[0])
         )
-        for path, info in sorted_items:
-            tree = self.get_tree(path, info)
-            yield path, tree, info
 
     def get_tree(self, path, info=None):
         """
@@ -242,8 +334,8 @@ class Storage(object):
         """
         if info is None:
             info = self.get_index()[path]
-        with open(os.path.join(self.folder, path), "rb") as f:
-            return load_html(f.read(), info["url"])
+        data = read_html_file(os.path.join(self.folder, path))
+        return load_html(data, info["url"])
 
     def check(self, verbose=True):
         """
@@ -263,10 +355,14 @@ class Storage(object):
                 errors += 1
                 continue
 
-            with open(fn_full, 'rb') as f:
-                data = f.read()
-
+            data = read_html_file(fn_full)
             doc = load_html(data, info['url'])
+            if 'fingerprints' not in info:
+                # cache fingerprints to make subsequent statistics
+                # calculation cheaper
+                self._fingerprints_cache[fn] = [
+                    self.get_fingerprint(form) for form in get_forms(doc)
+                ]
             if len(doc.xpath("//form")) != len(info["forms"]):
                 errors += 1
                 msg = "\nInvalid form count for entry %r: expected %d, got %d" % (
@@ -304,42 +400,238 @@ class Storage(object):
         """
         Return form fingerprint (a string that can be used for deduplication).
         """
-        return get_form_hash(form, only_visible=True)
+        return get_form_fingerprint(form, only_visible=True)
+
+    def reindex(self, verbose=True):
+        """
+        Compute fingerprints for all forms and save them to the index.
+        """
+        index = self.get_index()
+        items = list(index.items())
+        if verbose:
+            items = tqdm(items, "Reindexing", leave=True, mininterval=0,
+                         ascii=True, ncols=80, unit=' files')
+        for path, info in items:
+            forms = get_forms(self.get_tree(path, info))
+            info['fingerprints'] = [self.get_fingerprint(f) for f in forms]
+        self.write_index(index)
 
     def get_form_type_counts(self, drop_duplicates=True, drop_na=True,
                              simplify=False,
                              verbose=True):
         """ Return a {formtype: count} collections.Counter """
-        annotations = self.iter_annotations(verbose=verbose,
-                                            drop_duplicates=drop_duplicates,
-                                            drop_na=drop_na,
-                                            simplify_form_types=simplify)
-        return collections.Counter(ann.type for ann in annotations)
-
-    def print_form_type_counts(self, simplify=False, verbose=True):
-        """ Print the number annotations of each form types in this storage """
+        detailed, simplified = self.get_all_form_type_counts(
+            drop_duplicates=drop_duplicates,
+            drop_na=drop_na,
+            verbose=verbose,
+        )
+        return simplified if simplify else detailed
+
+    def get_all_form_type_counts(self, drop_duplicates=True, drop_na=True,
+                                 verbose=True):
+        """
+        Return ``(detailed, simplified)`` tuple of {formtype: count}
+        collections.Counter objects. Both are computed in a single pass
+        over the index; HTML is parsed only for entries without
+        stored or cached fingerprints.
+        """
+        index = self.get_index()
+        if verbose and drop_duplicates:
+            missing = sum(self._get_known_fingerprints(path, info) is None
+                          for path, info in index.items())
+            if missing:
+                print("%d file(s) without fingerprints will be parsed; "
+                      "run 'formasaurus reindex' to speed this up." % missing)
+
+        form_schema = self.get_form_schema()
+        accept_detailed = _form_type_filter(form_schema, drop_duplicates,
+                                            drop_na, True, False)
+        accept_simplified = _form_type_filter(form_schema, drop_duplicates,
+                                              drop_na, True, True)
+        detailed = collections.Counter()
+        simplified = collections.Counter()
+        forms = self._iter_index_forms(index, with_fingerprints=drop_duplicates)
+        for path, idx, fp, tp in forms:
+            for accept, counts in [(accept_detailed, detailed),
+                                   (accept_simplified, simplified)]:
+                form_tp = accept(tp, lambda: fp)
+                if form_tp is not None:
+                    counts[form_tp] += 1
+        return detailed, simplified
+
+    def print_form_type_counts(self, simplify=False, verbose=True,
+                               type_counts=None):
+        """
+        Print the number annotations of each form types in this storage.
+        Pass ``type_counts`` to print precomputed
+        :meth:`get_form_type_counts` results.
+        """
+        if type_counts is None:
+            type_counts = self.get_form_type_counts(
+                simplify=simplify,
+                verbose=verbose
+            )
         if simplify:
             print("Annotated HTML forms (simplified classes):\n")
         else:
             print("Annotated HTML forms (detailed classes):\n")
         schema = self.get_form_schema()
-        type_counts = self.get_form_type_counts(
-            simplify=simplify,
-            verbose=verbose
-        )
         for shortcut, count in type_counts.most_common():
             type_name = schema.types_inv[shortcut]
             print("%-5d %-25s (%s)" % (count, type_name, shortcut))
         print("\nTotal form count: %d" % (sum(type_counts.values())))
 
-    def generate_filename(self, url):
+    def print_all_form_type_counts(self, verbose=True):
+        """
+        Print the number annotations of each form types in this storage,
+        both for detailed and simplified classes.
+        """
+        detailed, simplified = self.get_all_form_type_counts(verbose=verbose)
+        self.print_form_type_counts(simplify=False, type_counts=detailed)
+        print("")
+        self.print_form_type_counts(simplify=True, type_counts=simplified)
+
+    def compress(self, compression='gzip', verbose=True):
+        """
+        Convert all HTML files in the storage to use ``compression``
+        ('gzip', 'zstd' or None to decompress); index is updated
+        to point to the new files. Return the number of converted files.
+        """
+        _check_compression(compression)
+        index = self.get_index()
+        items = list(index.items())
+        if verbose:
+            items = tqdm(items, "Converting", leave=True, mininterval=0,
+                         ascii=True, ncols=80, unit=' files')
+        # Originals are removed only after the updated index is written,
+        # so that the index never points to missing files if conversion
+        # is interrupted; converted files are overwritten on a next run.
+        renamed = []
+        for path, info in items:
+            new_path = _strip_compression_extension(path)
+            new_path += COMPRESSION_EXTENSIONS[compression]
+            if new_path == path:
+                continue
+            old_full = os.path.join(self.folder, path)
+            new_full = os.path.join(self.folder, new_path)
+            write_html_file(new_full, read_html_file(old_full), compression)
+            renamed.append((path, new_path))
+
+        for path, new_path in renamed:
+            index[new_path] = index.pop(path)
+        self.write_index(index)
+
+        for path, new_path in renamed:
+            os.remove(os.path.join(self.folder, path))
+            if path in self._fingerprints_cache:
+                self._fingerprints_cache[new_path] = self._fingerprints_cache.pop(path)
+        return len(renamed)
+
+    def generate_filename(self, url, compression=None):
         """ Return a name for a new file """
         p = urlparse.urlparse(url)
         idx = 0
         while True:
             name = "html/%s-%d.html" % (p.netloc, idx)
-            path = os.path.join(self.folder, name)
-            if os.path.exists(path):
+            taken = any(
+                os.path.exists(os.path.join(self.folder, name + ext))
+                for ext in COMPRESSION_EXTENSIONS.values()
+            )
+            if taken:
                 idx += 1
                 continue
-            return path
+            return os.path.join(self.folder,
+                                name + COMPRESSION_EXTENSIONS[compression])
+
+
+def _form_type_filter(form_schema, drop_duplicates=True, drop_na=True,
+                      drop_skipped=True, simplify_form_types=False):
+    """
+    Return an ``accept(form_type, get_fingerprint)`` function which returns
+    a (possibly simplified) form type, or None if the form should be dropped.
+    ``get_fingerprint`` is a callable which is only called when a fingerprint
+    is needed. Duplicates are tracked across calls.
+    """
+    seen = set()
+
+    def accept(tp, get_fingerprint):
+        if simplify_form_types:
+            tp = form_schema.simplify_map.get(tp, tp)
+
+        if drop_na and tp == form_schema.na_value:
+            return None
+
+        if drop_skipped and tp == form_schema.skip_value:
+            return None
+
+        if drop_duplicates:
+            fp = get_fingerprint()
+            if fp in seen:
+                return None
+            seen.add(fp)
+
+        return tp
+
+    return accept
+
+
+def _simplify_field_types(info, field_schema):
+    """
+    Return a shallow copy of index entry ``info`` with simplified
+    field types; ``info`` itself is not changed.
+    """
+    simplify_map = field_schema.simplify_map
+    info = dict(info)
+    info['visible_html_fields'] = [
+        {name: simplify_map.get(tp, tp) for name, tp in fields.items()}
+        for fields in info['visible_html_fields']
+    ]
+    return info
+
+
+def read_html_file(path):
+    """
+    Return contents of a (possibly compressed) HTML file as bytes.
+    Compression is detected using magic bytes.
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    if data.startswith(_GZIP_MAGIC):
+        return gzip.GzipFile(fileobj=io.BytesIO(data)).read()
+    if data.startswith(_ZSTD_MAGIC):
+        _check_compression('zstd')
+        return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+    return data
+
+
+def write_html_file(path, data, compression=None):
+    """
+    Save ``data`` bytes to a file, compressing them using ``compression``
+    method (None, 'gzip' or 'zstd').
+    """
+    _check_compression(compression)
+    if compression == 'gzip':
+        buf = io.BytesIO()
+        # mtime=0 makes output deterministic
+        with gzip.GzipFile(fileobj=buf, mode='wb', mtime=0) as f:
+            f.write(data)
+        data = buf.getvalue()
+    elif compression == 'zstd':
+        data = zstandard.ZstdCompressor(level=10).compress(data)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def _check_compression(compression):
+    if compression not in COMPRESSION_EXTENSIONS:
+        raise ValueError("Unknown compression method: %r" % compression)
+    if compression == 'zstd' and zstandard is None:
+        raise ImportError("zstandard package is required for zstd "
+                          "compression support.")
+
+
+def _strip_compression_extension(path):
+    for ext in COMPRESSION_EXTENSIONS.values():
+        if ext and path.endswith(ext):
+            return path[:-len(ext)]
+    return path
@@ -1,7 +1,13 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import
 import os
+import gc
 import sys
+import json
+import itertools
+import collections
+import threading
+import multiprocessing
 
 import requests
 from requests.compat import chardet
@@ -42,14 +48,65 @@ def add_scheme_if_missing(url):
     return url
 
 
+_tld_extractor = None
+_domain_cache = {}
+_domain_cache_stats = {'hits': 0, 'misses': 0}
+_DOMAIN_CACHE_SIZE = 100000
+
+CacheInfo = collections.namedtuple('CacheInfo',
+                                   'hits misses maxsize currsize')
+
+
+def _get_tld_extractor():
+    """
+    Return a TLDExtract instance which never goes to network: it uses
+    public suffix list snapshot bundled with tldextract.
+    """
+    global _tld_extractor
+    if _tld_extractor is None:
+        try:
+            _tld_extractor = tldextract.TLDExtract(suffix_list_urls=(),
+                                                   cache_dir=None)
+        except TypeError:
+            # tldextract < 3.0
+            _tld_extractor = tldextract.TLDExtract(suffix_list_urls=(),
+                                                   cache_file=False)
+    return _tld_extractor
+
+
 def get_domain(url):
     """
+    Return registered domain name without public suffix.
+    Results are memoized (``get_domain.cache_info()`` returns cache
+    statistics, like for ``functools.lru_cache``); no network
+    requests are made.
+
     >>> get_domain('example.org')
     'example'
     >>> get_domain('foo.example.co.uk')
     'example'
     """
-    return tldextract.extract(url).domain
+    try:
+        domain = _domain_cache[url]
+    except KeyError:
+        pass
+    else:
+        _domain_cache_stats['hits'] += 1
+        return domain
+    _domain_cache_stats['misses'] += 1
+    if len(_domain_cache) >= _DOMAIN_CACHE_SIZE:
+        _domain_cache.clear()
+    domain = _get_tld_extractor()(url).domain
+    _domain_cache[url] = domain
+    return domain
+
+
+def _get_domain_cache_info():
+    return CacheInfo(_domain_cache_stats['hits'], _domain_cache_stats['misses'],
+                     _DOMAIN_CACHE_SIZE, len(_domain_cache))
+
+
+get_domain.cache_info = _get_domain_cache_info
 
 
 def inverse_mapping(dct):
@@ -67,6 +124,52 @@ def at_root(*args):
     return os.path.join(os.path.dirname(__file__), *args)
 
 
+def get_model_params_path():
+    """
+    Return path to a JSON file with tuned model hyperparameters.
+    It can be set using FORMASAURUS_PARAMS environment variable.
+    """
+    env_path = os.environ.get("FORMASAURUS_PARAMS")
+    if env_path:
+        return os.path.expanduser(env_path)
+    return at_root("formasaurus-params.json")
+
+
+def is_strict_mode():
+    """
+    Return True if strict mode is enabled using FORMASAURUS_STRICT
+    environment variable (e.g. ``FORMASAURUS_STRICT=1``). In strict mode
+    models are never trained implicitly when a model file is missing.
+    """
+    value = os.environ.get("FORMASAURUS_STRICT", "")
+    return value.strip().lower() in {"1", "true", "yes", "on"}
+
+
+def load_model_params(key=None):
+    """
+    Return a dict with tuned hyperparameters of model ``key``
+    ('forms' or 'fields'), or a dict with parameters of all models
+    if ``key`` is None. Empty dict is returned if there are no tuned
+    parameters.
+    """
+    path = get_model_params_path()
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r') as f:
+        params = json.load(f)
+    if key is None:
+        return params
+    return params.get(key, {})
+
+
+def save_model_params(key, params):
+    """ Save tuned hyperparameters of model ``key`` ('forms' or 'fields') """
+    all_params = load_model_params()
+    all_params[key] = params
+    with open(get_model_params_path(), 'w') as f:
+        json.dump(all_params, f, indent=4, sort_keys=True)
+
+
 def thresholded(dct, threshold):
     """
     Return dict ``dct`` without all values less than threshold.
@@ -84,6 +187,138 @@ def thresholded(dct, threshold):
     return {k: v for k, v in dct.items() if v >= threshold}
 
 
+def iter_chunks(iterable, chunk_size):
+    """
+    Split ``iterable`` into lists of ``chunk_size`` elements
+    (the last list may be shorter).
+
+    >>> list(iter_chunks(range(5), 2))
+    [[0, 1], [2, 3], [4]]
+    """
+    it = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(it, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def get_n_jobs(n_jobs):
+    """
+    Return a number of processes to use: negative ``n_jobs`` values
+    are counted from the number of CPUs (-1 means "all CPUs").
+
+    >>> get_n_jobs(2)
+    2
+    >>> get_n_jobs(-1) == multiprocessing.cpu_count()
+    True
+    """
+    if n_jobs is None:
+        return 1
+    if n_jobs < 0:
+        return max(multiprocessing.cpu_count() + 1 + n_jobs, 1)
+    return max(n_jobs, 1)
+
+
+# (func, items) of the current fork_map call; it is set only
+# in worker processes, by the pool initializer
+_fork_map_state = None
+
+
+def _init_fork_map_worker(func, items):
+    global _fork_map_state
+    _fork_map_state = func, items
+
+
+def _fork_map_worker(bounds):
+    func, items = _fork_map_state
+    start, end = bounds
+    return [func(item) for item in items[start:end]]
+
+
+def fork_map(func, items, n_jobs=1, chunk_size=50):
+    """
+    Return ``[func(item) for item in items]``, computed in ``n_jobs``
+    worker processes, ``chunk_size`` items per task.
+
+    Worker processes are forked, so neither ``func`` nor ``items``
+    are pickled - this allows to process lxml elements. Results must
+    be picklable. When fork is not available, when there is
+    not enough work, when called from a worker process, or when
+    called not from the main thread or while other non-daemon threads
+    are running (forking a multi-threaded process is not safe), items
+    are processed in the current process.
+    """
+    items = list(items)
+    n_jobs = get_n_jobs(n_jobs)
+    if n_jobs == 1 or len(items) <= chunk_size or not _can_fork():
+        return [func(item) for item in items]
+
+    bounds = [(start, start + chunk_size)
+              for start in range(0, len(items), chunk_size)]
+    # workers are forked, so initializer arguments are not pickled
+    pool_kwargs = dict(initializer=_init_fork_map_worker,
+                       initargs=(func, items))
+    if hasattr(multiprocessing, 'get_context'):
+        pool = multiprocessing.get_context('fork').Pool(n_jobs, **pool_kwargs)
+    else:
+        # Python 2 always forks
+        pool = multiprocessing.Pool(n_jobs, **pool_kwargs)
+    try:
+        chunks = pool.map(_fork_map_worker, bounds)
+    finally:
+        pool.terminate()
+        pool.join()
+    return [res for chunk in chunks for res in chunk]
+
+
+def fork_call(funcs):
+    """
+    Call each function from ``funcs`` without arguments, each in its own
+    forked worker process; return a list of results.
+    See :func:`fork_map` for details.
+    """
+    funcs = list(funcs)
+    return fork_map(_call, funcs, n_jobs=len(funcs), chunk_size=1)
+
+
+def _call(func):
+    return func()
+
+
+def _can_fork():
+    if not hasattr(os, 'fork'):
+        return False
+    if multiprocessing.current_process().daemon:
+        # pool workers can't start their own pools
+        return False
+    if not isinstance(threading.current_thread(), threading._MainThread):
+        return False
+    if any(not thread.daemon for thread in threading.enumerate()
+           if thread is not threading.current_thread()):
+        # locks held by other threads would stay locked in a child;
+        # daemon threads (e.g. tqdm monitor) are ignored
+        return False
+    if hasattr(multiprocessing, 'get_all_start_methods'):
+        return 'fork' in multiprocessing.get_all_start_methods()
+    return True
+
+
+def freeze_gc():
+    """
+    Collect garbage and move all objects tracked by garbage collector
+    to a permanent generation, so that garbage collection in forked child
+    processes doesn't touch them (and doesn't copy memory pages they
+    are stored in). Return False if it is not supported
+    (``gc.freeze`` requires Python 3.7+).
+    """
+    gc.collect()
+    if not hasattr(gc, 'freeze'):
+        return False
+    gc.freeze()
+    return True
+
+
 def download(url):
     """
     Download a web page from url, return its content as unicode.
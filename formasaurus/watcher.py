@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""
+Hot reloading of models in long-running processes.
+
+:class:`ModelWatcher` polls a model file; when the file is changed
+(e.g. a model is retrained), a new model is loaded and warmed up
+in a background thread, and then it replaces the current model.
+Replacement is a single reference assignment: calls which are already
+running finish using the old model, new calls use the new model.
+
+Use :func:`formasaurus.classifiers.watch_model` to reload the shared
+instance used by :func:`formasaurus.extract_forms` and other module-level
+functions::
+
+    from formasaurus.classifiers import watch_model
+    watch_model(interval=10)
+
+"""
+from __future__ import absolute_import
+import os
+import threading
+import warnings
+
+from formasaurus.classifiers import FormFieldClassifier
+
+
+class ModelWatcher(object):
+    """
+    Watch a model file ``filename`` (the default model file is used
+    if it is None) and reload the model when the file changes.
+    The file is checked every ``interval`` seconds. A new model is used
+    only if it is loaded and :meth:`.FormFieldClassifier.warmup` succeeds,
+    and the file hasn't changed between two checks (so partially
+    written files are not loaded). Then ``on_reload`` callback is called
+    with the new :class:`.FormFieldClassifier` instance; it is also
+    available as ``watcher.classifier``.
+
+    If reloading fails, a warning is issued, the current model
+    is kept, and the file is loaded again only after it is changed.
+    """
+    def __init__(self, filename=None, interval=5.0, on_reload=None,
+                 thread_safe=True):
+        if filename is None:
+            filename = FormFieldClassifier._cached_model_path()
+        self.filename = filename
+        self.interval = interval
+        self.on_reload = on_reload
+        self.thread_safe = thread_safe
+        self.classifier = None
+        self.last_error = None
+        self._signature = None
+        self._pending_signature = None
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """
+        Start watching in a daemon thread. The current file is considered
+        to be already loaded.
+        """
+        if self._thread is not None:
+            raise ValueError("ModelWatcher is already started")
+        self._signature = self._get_signature()
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run,
+                                        name='formasaurus-watcher')
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """ Stop watching """
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def check(self):
+        """
+        Check the model file once and reload the model if it is changed.
+        Return True if a new model is loaded.
+        """
+        signature = self._get_signature()
+        if signature is None or signature == self._signature:
+            self._pending_signature = None
+            return False
+        if signature != self._pending_signature:
+            # the file may still be being written; wait for the next check
+            self._pending_signature = signature
+            return False
+
+        self._pending_signature = None
+        self._signature = signature
+        try:
+            classifier = FormFieldClassifier.load(
+                self.filename, autocreate=False, thread_safe=self.thread_safe)
+            classifier.warmup()
+        except Exception as e:
+            self.last_error = e
+            warnings.warn("Model %s is not reloaded: %s: %s" % (
+                self.filename, type(e).__name__, e))
+            return False
+
+        self.last_error = None
+        self.classifier = classifier
+        if self.on_reload is not None:
+            self.on_reload(classifier)
+        return True
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.check()
+            except Exception as e:
+                warnings.warn("Model watcher error: %s: %s" % (
+                    type(e).__name__, e))
+
+    def _get_signature(self):
+        try:
+            stat = os.stat(self.filename)
+        except OSError:
+            return None
+        return stat.st_ino, stat.st_size, stat.st_mtime
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""
+Co-process worker which classifies forms in HTML pages read from stdin
+and writes results to stdout. It allows to use Formasaurus from other
+languages without paying for Python startup and model loading
+on each call: start a pool of ``formasaurus worker`` processes and
+keep them running.
+
+Each request is a JSON object::
+
+    {"id": 1, "html": "<html>...", "threshold": 0.05, "fields": true}
+
+Only "html" is required; "id" can be any JSON value, it is copied
+to the response. Work budgets ("max_forms", "max_fields_per_form",
+"max_options_per_select" and "timeout", see
+:meth:`.FormFieldClassifier.extract_forms`) can also be passed.
+
+For each request a response is written, in the same order::
+
+    {"id": 1, "forms": [{"form": {...}, "fields": {...}}, ...]}
+
+``forms`` contains probabilities, like :func:`formasaurus.classify_proba`
+results, for each form on the page, in document order;
+``"truncated": true`` is added if some forms are skipped because
+of work budgets. If a request can't be processed, the response is
+``{"id": 1, "error": "..."}``; the worker continues to read requests.
+It exits when stdin is closed.
+
+Two framings are supported:
+
+* ``ndjson`` (default) - each request and response is a single line
+  of UTF-8 encoded JSON;
+* ``length`` - each request and response is UTF-8 encoded JSON prefixed
+  with its length in bytes, as a 4-byte big-endian unsigned integer.
+
+Anything else the worker prints (e.g. training progress) goes to stderr.
+"""
+from __future__ import absolute_import, print_function
+import sys
+import json
+import struct
+
+import six
+
+from formasaurus.classifiers import FormFieldClassifier
+from formasaurus.html import load_html
+
+
+FRAMINGS = ('ndjson', 'length')
+
+_BUDGET_KEYS = ('max_forms', 'max_fields_per_form', 'max_options_per_select',
+                'timeout')
+
+
+def run_worker(classifier=None, stdin=None, stdout=None, framing='ndjson',
+               threshold=0.05, model_path=None, strict=None):
+    """
+    Read requests from ``stdin`` and write responses to ``stdout``
+    (binary streams; process stdin and stdout are used by default)
+    until ``stdin`` is closed. If ``classifier`` is None, a model
+    is loaded from ``model_path`` (see :meth:`.FormFieldClassifier.load`
+    for ``strict`` argument). ``threshold`` is used for requests
+    which don't set it.
+    """
+    if framing not in FRAMINGS:
+        raise ValueError("Unknown framing: %r" % framing)
+    if stdin is None:
+        stdin = getattr(sys.stdin, 'buffer', sys.stdin)
+    if stdout is None:
+        stdout = getattr(sys.stdout, 'buffer', sys.stdout)
+
+    # keep stdout for protocol messages only
+    orig_stdout = sys.stdout
+    sys.stdout = sys.stderr
+    try:
+        if classifier is None:
+            classifier = FormFieldClassifier.load(model_path, strict=strict)
+        classifier.warmup()
+
+        read, write = {
+            'ndjson': (_read_line, _write_line),
+            'length': (_read_length_prefixed, _write_length_prefixed),
+        }[framing]
+        while True:
+            message = read(stdin)
+            if message is None:
+                break
+            response = handle_message(classifier, message, threshold)
+            write(stdout, json.dumps(response).encode('utf8'))
+            stdout.flush()
+    finally:
+        sys.stdout = orig_stdout
+
+
+def handle_message(classifier, message, threshold=0.05):
+    """
+    Return a response for a request ``message`` (JSON-encoded bytes).
+    Errors are returned as ``{"id": ..., "error": "..."}`` responses.
+    """
+    try:
+        request = json.loads(message.decode('utf8'))
+    except ValueError as e:
+        return {'id': None, 'error': "invalid JSON: %s" % e}
+    if not isinstance(request, dict):
+        return {'id': None, 'error': "request must be a JSON object"}
+
+    request_id = request.get('id')
+    html = request.get('html')
+    if not isinstance(html, six.string_types):
+        return {'id': request_id, 'error': "'html' is required"}
+    try:
+        if not html.strip():
+            return {'id': request_id, 'forms': []}
+        budget = {key: request[key] for key in _BUDGET_KEYS if key in request}
+        forms = classifier.extract_forms(
+            load_html(html),
+            proba=True,
+            threshold=request.get('threshold', threshold),
+            fields=request.get('fields', True),
+            **budget
+        )
+    except Exception as e:
+        return {'id': request_id, 'error': "%s: %s" % (type(e).__name__, e)}
+
+    response = {'id': request_id, 'forms': [info for form, info in forms]}
+    if forms.truncated:
+        response['truncated'] = True
+    return response
+
+
+def _read_line(stream):
+    while True:
+        line = stream.readline()
+        if not line:
+            return None
+        if line.strip():
+            return line
+
+
+def _write_line(stream, data):
+    # json.dumps escapes newlines in strings
+    stream.write(data + b'\n')
+
+
+_LENGTH = struct.Struct('>I')
+
+
+def _read_length_prefixed(stream):
+    header = _read_exactly(stream, _LENGTH.size)
+    if header is None:
+        return None
+    length, = _LENGTH.unpack(header)
+    data = _read_exactly(stream, length)
+    if data is None:
+        raise EOFError("unexpected end of input")
+    return data
+
+
+def _write_length_prefixed(stream, data):
+    stream.write(_LENGTH.pack(len(data)))
+    stream.write(data)
+
+
+def _read_exactly(stream, size):
+    """ Read ``size`` bytes; return None if the stream is at EOF """
+    chunks = []
+    remaining = size
+    while remaining:
+        chunk = stream.read(remaining)
+        if not chunk:
+            if chunks:
+                raise EOFError("unexpected end of input")
+            return None
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b''.join(chunks)
@@ -28,7 +28,7 @@ setup(
     description="Formasaurus tells you the types of HTML forms and their fields using machine learning",
     url='https://github.com/TeamHG-Memex/Formasaurus',
     zip_safe=False,
-    packages=['formasaurus'],
+    packages=['formasaurus', 'formasaurus.contrib'],
     install_requires=[
         "tqdm >= 2.0",
         "tldextract",
@@ -36,17 +36,22 @@ setup(
         "six",
         "requests",
         "w3lib >= 1.13.0",
+        'futures; python_version < "3.0"',
     ],
     package_data={
         'formasaurus': [
             'data/*.json',
-            'data/html/*.html'
+            'data/html/*.html',
+            'data/html/*.html.gz',
+            'data/html/*.html.zst',
         ],
     },
     extras_require={
         # Work around https://github.com/pypa/pip/issues/3032
         'with-deps': with_deps_extras,
         'with_deps': with_deps_extras,
+        'zstd': ['zstandard'],
+        'scrapy': ['scrapy >= 2.0'],
         'annotation': [
             'ipython[notebook] >= 4.0',
             'ipywidgets',
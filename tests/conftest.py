@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import
 import io
+import sys
 
 import lxml.html
 import pytest
@@ -9,6 +10,10 @@ from formasaurus.classifiers import DEFAULT_DATA_PATH
 from formasaurus.storage import Storage
 
 
+if sys.version_info < (3, 5):
+    collect_ignore = ['test_aio.py']
+
+
 LOGIN_PAGE = b'''
 <html>
     <body>
@@ -21,6 +26,20 @@ LOGIN_PAGE = b'''
 </html>
 '''
 
+LOGIN_FORM = u'''
+<form action="/login" method="post">
+    <input name="username" type="text"/>
+    <input name="password" type="password"/>
+    <input type="submit" value="Login"/>
+</form>
+'''
+
+
+@pytest.fixture
+def login_form():
+    """ HTML source of a login form, as text """
+    return LOGIN_FORM
+
 
 @pytest.fixture
 def tree():
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import formasaurus
+from formasaurus import aio
+
+
+def run(coro):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        if hasattr(loop, 'shutdown_default_executor'):
+            # don't leave executor threads running: they disable forking
+            loop.run_until_complete(loop.shutdown_default_executor())
+        loop.close()
+
+
+def _infos(forms):
+    return [info for form, info in forms]
+
+
+def test_extract_forms(tree):
+    expected = formasaurus.extract_forms(tree, proba=True)
+    forms = run(aio.extract_forms(tree, proba=True))
+    assert _infos(forms) == _infos(expected)
+    assert forms[0][0].tag == 'form'
+
+
+def test_extract_forms_many(login_form):
+    expected = _infos(formasaurus.extract_forms(login_form))
+    pages = [login_form] * 5 + ['<p>no forms</p>']
+    with ThreadPoolExecutor(2) as executor:
+        results = run(aio.extract_forms_many(pages, executor=executor,
+                                             max_concurrency=2))
+    assert [_infos(forms) for forms in results] == [expected] * 5 + [[]]
+
+
+def test_extract_forms_process_executor(tree, login_form):
+    expected = _infos(formasaurus.extract_forms(login_form, proba=True))
+    with aio.process_executor(max_workers=2) as executor:
+        results = run(aio.extract_forms_many([login_form] * 3, proba=True,
+                                             executor=executor))
+        with pytest.raises(TypeError):
+            run(aio.extract_forms(tree, executor=executor))
+    assert [_infos(forms) for forms in results] == [expected] * 3
+    form = results[0][0][0]
+    assert form.tag == 'form'
+    assert form.xpath('.//input/@name') == ['username', 'password']
+
+
+def test_extract_forms_many_cancel(login_form):
+    async def main():
+        task = asyncio.ensure_future(aio.extract_forms_many(
+            [login_form] * 50, max_concurrency=1))
+        await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+    run(main())
+
+
+def test_extract_forms_many_errors(login_form):
+    results = run(aio.extract_forms_many([login_form, None],
+                                         return_exceptions=True))
+    assert len(results[0]) == 1
+    assert isinstance(results[1], Exception)
+
+
+def test_extract_forms_budget(login_form):
+    with aio.process_executor(max_workers=1) as executor:
+        forms = run(aio.extract_forms(login_form * 3, executor=executor,
+                                      max_forms=2))
+    assert len(forms) == 2
+    assert forms.truncated
+    forms = run(aio.extract_forms(login_form * 3, max_forms=2))
+    assert forms.truncated
+
+
+def test_extract_forms_process_executor_tail(login_form):
+    html = login_form + "Advanced search <b>tips</b>"
+    with aio.process_executor(max_workers=1) as executor:
+        forms = run(aio.extract_forms(html, executor=executor))
+    assert len(forms) == 1
+    form = forms[0][0]
+    assert form.tag == 'form'
+    assert form.tail is None
@@ -1,10 +1,19 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import
+import os
+import gc
+import time
+import pickle
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
 import pytest
 
 import formasaurus
 from formasaurus import classifiers
 from formasaurus.html import get_forms
+from formasaurus.utils import fork_call, save_model_params
 
 
 def test_extract_forms(tree):
@@ -79,3 +88,264 @@ def test_classify_proba(tree):
     res2 = formasaurus.extract_forms(tree, proba=True, threshold=0.05)[0][1]
     assert res1 == res2
 
+
+def test_train_concurrent(storage, tree):
+    annotations = list(itertools.islice(storage.iter_annotations(
+        simplify_form_types=True,
+        simplify_field_types=True,
+    ), 0, 200))
+    form = get_forms(tree)[0]
+    results = []
+    for concurrent in [True, False]:
+        ex = classifiers.FormFieldClassifier()
+        ex.train(annotations, concurrent=concurrent)
+        results.append(ex.classify_proba(form, threshold=0))
+    assert results[0] == results[1]
+
+
+def test_trained_on_concurrent(monkeypatch):
+    # models are trained in forked processes even after annotations
+    # are loaded with a progress bar (tqdm starts a monitor thread)
+    def train_form_classifier(self, annotations, **kwargs):
+        self.model = os.getpid()
+
+    def train_field_model(annotations, **kwargs):
+        return os.getpid()
+
+    monkeypatch.setattr(classifiers.FormClassifier, 'train',
+                        train_form_classifier)
+    monkeypatch.setattr(classifiers.fieldtype_model, 'train',
+                        train_field_model)
+    ex = classifiers.FormFieldClassifier.trained_on(
+        classifiers.DEFAULT_DATA_PATH)
+    pids = {ex.form_classifier.model, ex._field_model}
+    assert len(pids) == 2
+    assert os.getpid() not in pids
+
+
+def test_incremental_update(storage, tree, tmpdir):
+    annotations = list(itertools.islice(storage.iter_annotations(
+        simplify_form_types=True,
+        simplify_field_types=True,
+    ), 0, 300))
+    ex = classifiers.FormFieldClassifier()
+    ex.train(annotations[:200], incremental=True)
+    n_sequences = len(ex._field_training_data[0])
+
+    # training data is saved next to the model, not inside it
+    path = str(tmpdir.join('model.joblib'))
+    ex.save(path)
+    data_path = path + classifiers.FIELD_TRAINING_DATA_SUFFIX
+    assert os.path.exists(data_path)
+    assert os.path.getsize(data_path) > 0
+    ex = classifiers.FormFieldClassifier.load(path, autocreate=False)
+    assert ex._field_training_data is None
+
+    field_model = ex._field_model
+    modelfile = field_model.modelfile.name
+    ex.update([a for a in annotations[200:] if a.type_full in ex.form_classes])
+    assert len(ex._field_training_data[0]) > n_sequences
+    # the old model is replaced, not refit in-place
+    assert ex._field_model is not field_model
+    assert field_model.modelfile.name == modelfile
+
+    form = get_forms(tree)[0]
+    assert ex.classify(form)['fields'] == {'password': 'password',
+                                           'username': 'username'}
+
+    classifiers.get_instance().save(path)
+    assert not os.path.exists(data_path)
+
+
+def test_update_not_incremental(storage):
+    ex = classifiers.get_instance()
+    with pytest.raises(ValueError):
+        ex.update([])
+
+
+def test_get_instance_concurrent(monkeypatch):
+    ex = classifiers.get_instance()
+    calls = []
+
+    def load(**kwargs):
+        calls.append(kwargs)
+        time.sleep(0.1)
+        return ex
+
+    monkeypatch.setattr(classifiers, '_form_field_classifier', None)
+    monkeypatch.setattr(classifiers.FormFieldClassifier, 'load', load)
+    threads = [threading.Thread(target=classifiers.get_instance)
+               for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert calls == [{'thread_safe': True}]
+    assert classifiers.get_instance() is ex
+
+
+def test_thread_safe(storage):
+    ex = classifiers.get_instance()
+    assert ex.thread_safe
+    forms = [a.form for a in itertools.islice(storage.iter_annotations(
+        simplify_form_types=True, simplify_field_types=True), 0, 100)]
+    expected = [ex.classify_proba(form, threshold=0) for form in forms]
+    with ThreadPoolExecutor(8) as executor:
+        for i in range(3):
+            results = list(executor.map(
+                lambda form: ex.classify_proba(form, threshold=0), forms))
+            assert results == expected
+
+    models = []
+    def get_model():
+        models.append(ex._get_field_model())
+    threads = [threading.Thread(target=get_model) for i in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert models[0] is not models[1]
+    assert ex._get_field_model() is ex._get_field_model()
+
+    ex2 = pickle.loads(pickle.dumps(ex))
+    assert ex2.classify_proba(forms[0], threshold=0) == expected[0]
+
+
+def test_preload_for_fork(tree):
+    ex = classifiers.FormFieldClassifier.preload_for_fork()
+    try:
+        assert ex is classifiers.get_instance()
+        assert ex._get_field_model()._tagger is not None
+        if hasattr(gc, 'get_freeze_count'):
+            assert gc.get_freeze_count() > 0
+        form = get_forms(tree)[0]
+        expected = ex.classify_proba(form)
+        assert fork_call([lambda: formasaurus.classify_proba(form)]) == [expected]
+    finally:
+        if hasattr(gc, 'unfreeze'):
+            gc.unfreeze()
+
+
+def test_cached_model_path_stable(tmpdir, monkeypatch):
+    monkeypatch.setenv('FORMASAURUS_PARAMS', str(tmpdir.join('params.json')))
+    path = classifiers.FormFieldClassifier._cached_model_path()
+    save_model_params('forms', {'logisticregression__C': 1.5})
+    assert classifiers.FormFieldClassifier._cached_model_path() == path
+
+
+def test_warmup():
+    ex = classifiers.get_instance()
+    ex.warmup()
+    assert ex._get_field_model()._tagger is not None
+
+
+def test_load_strict(tmpdir, monkeypatch):
+    path = str(tmpdir.join('missing.joblib'))
+    with pytest.raises(IOError):
+        classifiers.FormFieldClassifier.load(path, strict=True)
+    with pytest.raises(ValueError):
+        classifiers.FormFieldClassifier.load(path, rebuild=True, strict=True)
+
+    monkeypatch.setenv('FORMASAURUS_STRICT', '1')
+    with pytest.raises(IOError):
+        classifiers.FormFieldClassifier.load(path)
+
+    classifiers.get_instance()  # make sure the default model exists
+    ex = classifiers.FormFieldClassifier.load()
+    assert ex.form_classes is not None
+
+
+def test_load_async(tmpdir, tree):
+    future = classifiers.FormFieldClassifier.load_async()
+    ex = future.result(timeout=600)
+    assert ex._get_field_model()._tagger is not None
+    form = get_forms(tree)[0]
+    assert ex.classify(form) == classifiers.get_instance().classify(form)
+
+    path = str(tmpdir.join('missing.joblib'))
+    future = classifiers.FormFieldClassifier.load_async(path, strict=True)
+    with pytest.raises(IOError):
+        future.result(timeout=60)
+
+    with ThreadPoolExecutor(1) as executor:
+        future = classifiers.FormFieldClassifier.load_async(
+            executor=executor, warmup=False, thread_safe=True)
+        assert future.result(timeout=600).thread_safe
+
+
+BIG_PAGE = """
+<form action="/search"><input name="q" type="text"/></form>
+<form action="/login" method="post">
+    <input name="username" type="text"/>
+    <input name="password" type="password"/>
+    <select name="lang">%s</select>
+    <input type="submit" value="Login"/>
+</form>
+<form action="/subscribe"><input name="email" type="text"/></form>
+""" % "".join('<option value="%d">%d</option>' % (i, i) for i in range(500))
+
+
+@pytest.mark.parametrize('proba', [False, True])
+def test_extract_forms_budget(proba):
+    forms = formasaurus.extract_forms(BIG_PAGE, proba=proba)
+    assert len(forms) == 3
+    assert not forms.truncated
+    assert all('truncated' not in info for form, info in forms)
+
+    forms = formasaurus.extract_forms(BIG_PAGE, proba=proba, max_forms=2)
+    assert len(forms) == 2
+    assert forms.truncated
+
+    forms = formasaurus.extract_forms(BIG_PAGE, proba=proba,
+                                      max_fields_per_form=2)
+    assert not forms.truncated
+    assert sorted(forms[1][1]['fields']) == ['password', 'username']
+    assert forms[1][1]['truncated']
+    assert 'truncated' not in forms[0][1]
+
+    forms = formasaurus.extract_forms(BIG_PAGE, proba=proba,
+                                      max_options_per_select=10)
+    assert sorted(forms[1][1]['fields']) == ['lang', 'password', 'username']
+    assert forms[1][1]['truncated']
+    assert 'truncated' not in forms[2][1]
+
+    forms = formasaurus.extract_forms(BIG_PAGE, proba=proba, timeout=0)
+    assert forms == []
+    assert forms.truncated
+
+
+def test_classify_deadline(tree):
+    form = get_forms(tree)[0]
+    res = formasaurus.classify(form, deadline=time.time() - 1)
+    assert res == {'form': 'login', 'fields': {}, 'truncated': True}
+    res = formasaurus.classify_proba(form, deadline=time.time() + 60)
+    assert 'truncated' not in res
+    assert sorted(res['fields']) == ['password', 'username']
+
+
+def test_extracted_forms_pickle():
+    forms = classifiers.ExtractedForms([('<form></form>', {})], truncated=True)
+    forms = pickle.loads(pickle.dumps(forms, protocol=2))
+    assert forms == [('<form></form>', {})]
+    assert forms.truncated
+
+
+@pytest.mark.parametrize('fields', [True, False])
+def test_classify_proba_compact(tree, fields):
+    form = get_forms(tree)[0]
+    expected = formasaurus.classify_proba(form, threshold=0.05, fields=fields)
+    res = formasaurus.classify_proba(form, threshold=0.05, fields=fields,
+                                     compact=True)
+    assert res.to_dict() == expected
+    assert res.argmax == 'login'
+    if fields:
+        assert res.field_argmax == {'password': 'password',
+                                    'username': 'username'}
+        assert res.fields['password'] == expected['fields']['password']
+
+    forms = formasaurus.extract_forms(BIG_PAGE, proba=True, compact=True,
+                                      max_fields_per_form=2, fields=fields)
+    expected = formasaurus.extract_forms(BIG_PAGE, proba=True,
+                                         max_fields_per_form=2, fields=fields)
+    assert [info.to_dict() for form, info in forms] == [
+        info for form, info in expected]
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+import sys
+import json
+import base64
+import subprocess
+
+import pytest
+
+scrapy = pytest.importorskip('scrapy')
+from scrapy.http import HtmlResponse, TextResponse, Request
+from scrapy.utils.test import get_crawler
+
+from formasaurus.contrib.scrapy import extract_forms, FormasaurusMiddleware
+
+
+HTML = u"""
+<html><head><meta charset="cp1251"></head><body>
+<form action="/login" method="post">
+    Логин <input name="username">
+    Пароль <input type="password" name="password">
+    <input type="submit" value="Войти">
+</form>
+Забыли пароль?
+</body></html>
+"""
+
+
+CRAWL_SCRIPT = """
+import sys, json
+import scrapy
+from scrapy.crawler import CrawlerProcess
+
+
+class FormSpider(scrapy.Spider):
+    name = 'forms'
+
+    async def start(self):
+        for request in self.start_requests():
+            yield request
+
+    def start_requests(self):
+        url = sys.argv[1]
+        yield scrapy.Request(url)
+        yield scrapy.Request(url + '#skip', meta={'formasaurus': False},
+                             dont_filter=True)
+
+    def parse(self, response):
+        forms = response.meta.get('formasaurus_forms')
+        print(json.dumps([response.url.endswith('#skip'), None if forms is None else [
+            [form.xpath('.//input/@name'), info] for form, info in forms
+        ]]))
+
+
+process = CrawlerProcess(settings={
+    'LOG_LEVEL': 'ERROR',
+    'DOWNLOADER_MIDDLEWARES': {
+        'formasaurus.contrib.scrapy.FormasaurusMiddleware': 950,
+    },
+    'FORMASAURUS_EXECUTOR': sys.argv[2],
+})
+process.crawl(FormSpider)
+process.start()
+"""
+
+
+def _response(html=HTML, cls=HtmlResponse, **kwargs):
+    return cls('http://example.com', body=html.encode('cp1251'),
+               encoding='cp1251', **kwargs)
+
+
+def test_extract_forms():
+    forms = extract_forms(_response())
+    assert len(forms) == 1
+    form, info = forms[0]
+    assert info == {
+        'form': 'login',
+        'fields': {'username': 'username', 'password': 'password'},
+    }
+    assert u'Войти' in form.xpath('.//input/@value')
+
+
+def test_should_process():
+    crawler = get_crawler(settings_dict={'FORMASAURUS_MAX_BODY_SIZE': 1000})
+    mw = FormasaurusMiddleware.from_crawler(crawler)
+    request = Request('http://example.com')
+    assert mw._should_process(request, _response())
+    assert not mw._should_process(request, _response(cls=TextResponse))
+    assert not mw._should_process(request, _response(html=HTML * 10))
+    request = Request('http://example.com', meta={'formasaurus': False})
+    assert not mw._should_process(request, _response())
+
+
+def test_disabled():
+    crawler = get_crawler(settings_dict={'FORMASAURUS_ENABLED': False})
+    with pytest.raises(scrapy.exceptions.NotConfigured):
+        FormasaurusMiddleware.from_crawler(crawler)
+
+
+@pytest.mark.parametrize(['executor'], [['thread'], ['process'], ['inline']])
+def test_crawl(executor):
+    body = base64.b64encode(HTML.encode('cp1251')).decode('ascii')
+    url = 'data:text/html;charset=cp1251;base64,' + body
+    out = subprocess.check_output([sys.executable, '-c', CRAWL_SCRIPT,
+                                   url, executor])
+    results = sorted(json.loads(line) for line in out.decode('utf8').splitlines())
+    assert results == [
+        [False, [[['username', 'password'], {
+            'form': 'login',
+            'fields': {'username': 'username', 'password': 'password'},
+        }]]],
+        [True, None],
+    ]
@@ -5,12 +5,20 @@ import itertools
 import numpy as np
 from sklearn_crfsuite.metrics import flat_accuracy_score
 
+from formasaurus import formtype_model
 from formasaurus.fieldtype_model import (
     train,
     _PRECISE_C1_C2,
     _REALISTIC_C1_C2,
     get_Xy,
+    print_classification_report,
+    train_streaming,
+    tune,
+    get_model,
+    get_model_stats,
+    print_pruning_report,
 )
+from formasaurus.utils import save_model_params
 
 
 def test_training(storage, capsys):
@@ -50,3 +58,105 @@ def test_training(storage, capsys):
     field_schema = storage.get_field_schema()
     short_names = set(field_schema.types_inv.keys())
     assert set(crf.classes_).issubset(short_names)
+
+
+def test_get_Xy_parallel(storage):
+    annotations = list(itertools.islice(storage.iter_annotations(
+        simplify_form_types=True,
+        simplify_field_types=True,
+    ), 0, 200))
+    form_types = np.asarray([a.type for a in annotations])
+    X1, y1 = get_Xy(annotations, form_types)
+    X2, y2 = get_Xy(annotations, form_types, n_jobs=2)
+    assert X1 == X2
+    assert y1 == y2
+
+
+def test_classification_report_shared_form_labels(storage, capsys):
+    annotations = list(itertools.islice(storage.iter_annotations(
+        simplify_form_types=True,
+        simplify_field_types=True,
+    ), 0, 200))
+    form_labels = formtype_model.print_classification_report(
+        annotations, n_splits=2, n_jobs=1)
+    assert len(form_labels) == len(annotations)
+    print_classification_report(annotations, n_splits=2, n_jobs=1,
+                                realistic_form_types=form_labels)
+    out, err = capsys.readouterr()
+    assert 'forms are classified correctly' in out
+    assert 'fields are classified correctly' in out
+
+
+def test_train_streaming(storage):
+    annotations = list(itertools.islice(storage.iter_annotations(
+        simplify_form_types=True,
+        simplify_field_types=True,
+    ), 0, 200))
+    crf = train_streaming(iter(annotations), full_field_type_names=False,
+                          chunk_size=30)
+    annotations = [a for a in annotations
+                   if a.fields_annotated and a.form_annotated]
+    form_types = [a.type for a in annotations]
+    X, y = get_Xy(annotations, form_types, full_type_names=False)
+    assert flat_accuracy_score(y, crf.predict(X)) > 0.9
+
+
+def test_training_early_stopping(storage, capsys):
+    annotations = list(itertools.islice(storage.iter_annotations(
+        simplify_form_types=True,
+        simplify_field_types=True,
+    ), 0, 300))
+    crf = train(annotations, early_stopping=True)
+    out, err = capsys.readouterr()
+    assert 'training iterations' in out
+    assert 1 <= crf.n_iter_ < crf.max_iterations
+
+
+def test_tune(storage, tmpdir, monkeypatch):
+    monkeypatch.setenv('FORMASAURUS_PARAMS', str(tmpdir.join('params.json')))
+    annotations = list(itertools.islice(storage.iter_annotations(
+        simplify_form_types=True,
+        simplify_field_types=True,
+    ), 0, 150))
+    params = tune(annotations, n_splits=2, n_candidates=3, min_iterations=5,
+                  n_jobs=1)
+    assert set(params) == {'c1', 'c2'}
+    assert (get_model().c1, get_model().c2) == _PRECISE_C1_C2
+    save_model_params('fields', params)
+    crf = get_model()
+    assert (crf.c1, crf.c2) == (params['c1'], params['c2'])
+    crf = get_model(use_precise_form_types=False)
+    assert (crf.c1, crf.c2) == _REALISTIC_C1_C2
+
+
+def test_training_pruning(storage, capsys):
+    annotations = list(itertools.islice(storage.iter_annotations(
+        simplify_form_types=True,
+        simplify_field_types=True,
+    ), 0, 300))
+    crf = train(annotations)
+    crf_pruned = train(annotations, min_freq=2, min_weight=0.05)
+    out, err = capsys.readouterr()
+    assert 'Pruned state features' in out
+
+    annotations = [a for a in annotations
+                   if a.fields_annotated and a.form_annotated]
+    form_types = [a.type for a in annotations]
+    X, y = get_Xy(annotations, form_types, full_type_names=True)
+    stats = get_model_stats(crf, X)
+    stats_pruned = get_model_stats(crf_pruned, X)
+    assert stats_pruned['n_features'] < stats['n_features']
+    assert stats_pruned['size'] < stats['size']
+    assert flat_accuracy_score(y, crf_pruned.predict(X)) > 0.9
+
+
+def test_print_pruning_report(storage, capsys):
+    annotations = list(itertools.islice(storage.iter_annotations(
+        simplify_form_types=True,
+        simplify_field_types=True,
+    ), 0, 200))
+    print_pruning_report(annotations, min_freqs=[0], min_weights=[0, 0.1])
+    out, err = capsys.readouterr()
+    lines = out.strip().splitlines()
+    assert len(lines) == 3
+    assert 'accuracy' in lines[0]
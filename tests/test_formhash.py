@@ -1,6 +1,6 @@
 # -*- coding: utf-8 -*-
 import pytest
-from formasaurus.formhash import get_form_hash
+from formasaurus.formhash import get_form_hash, get_form_fingerprint
 
 FORM_HIDDEN1 = """
 <form>
@@ -90,3 +90,11 @@ def test_formhash_hidden():
     hash1 = get_form_hash(FORM_HIDDEN1, only_visible=False)
     hash2 = get_form_hash(FORM_HIDDEN2, only_visible=False)
     assert hash1 != hash2
+
+
+def test_form_fingerprint():
+    fp1 = get_form_fingerprint(FORM_HIDDEN1)
+    fp2 = get_form_fingerprint(FORM_HIDDEN2)
+    assert fp1 == fp2
+    assert len(fp1) == 40
+    assert fp1 != get_form_fingerprint(FORM_HIDDEN1, only_visible=False)
@@ -1,10 +1,30 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import, division
+import os
+import pickle
 import itertools
 
+import joblib
+from joblib.externals.loky import get_reusable_executor
+import lxml.html
+import numpy as np
+import pytest
 from sklearn.metrics import accuracy_score
 
-from formasaurus.formtype_model import get_realistic_form_labels
+from formasaurus.utils import iter_chunks, save_model_params
+
+from formasaurus.formtype_model import (
+    get_realistic_form_labels,
+    train,
+    update,
+    train_streaming,
+    tune,
+    get_model,
+    slim,
+    print_slimming_report,
+    FeatureStore,
+    FEATURES,
+)
 
 
 def test_get_realistic_formtypes(storage):
@@ -14,3 +34,152 @@ def test_get_realistic_formtypes(storage):
     score = accuracy_score(y_true, y_pred)
     assert 0.7 < score < 0.98
 
+
+
+def test_feature_store(storage, tmpdir):
+    annotations = list(itertools.islice(storage.iter_annotations(), 0, 100))
+    forms = [a.form for a in annotations]
+    path = str(tmpdir.join('features.joblib'))
+
+    fs = FeatureStore(path)
+    rows = fs.get_raw_features(forms)
+    assert len(rows) == len(forms)
+    assert len(rows[0]) == len(FEATURES)
+    fs.save()
+
+    fs2 = FeatureStore(path)
+    assert fs2.get_raw_features(forms) == rows
+    assert not fs2._changed
+
+
+def test_feature_store_ignores_tail():
+    forms = [
+        lxml.html.fragment_fromstring(
+            '<form><input name="q" type="text"></form>%s' % tail,
+            create_parent='div').find('form')
+        for tail in ['Search the site', 'Forgot password?']
+    ]
+    fs = FeatureStore()
+    assert fs.get_raw_features(forms[:1]) == fs.get_raw_features(forms[1:])
+    assert len(fs._cache) == 1
+
+
+def test_train_feature_store(storage):
+    annotations = list(itertools.islice(storage.iter_annotations(), 0, 200))
+    model1 = train(annotations, full_type_names=True)
+    model2 = train(annotations, full_type_names=True,
+                   feature_store=FeatureStore())
+    forms = [a.form for a in annotations[:20]]
+    assert np.allclose(model1.predict_proba(forms), model2.predict_proba(forms))
+
+
+def test_train_parallel(storage):
+    annotations = list(itertools.islice(storage.iter_annotations(), 0, 200))
+    model1 = train(annotations, full_type_names=True)
+    model2 = train(annotations, full_type_names=True, n_jobs=2)
+    forms = [a.form for a in annotations[:20]]
+    assert np.allclose(model1.predict_proba(forms), model2.predict_proba(forms))
+
+    fs = FeatureStore()
+    assert fs.get_raw_features(forms, n_jobs=2) == FeatureStore().get_raw_features(forms)
+
+    # FeatureUnion uses joblib's reusable executor; stop its manager thread,
+    # so that it doesn't disable forking in other tests
+    get_reusable_executor().shutdown(wait=True)
+
+
+def test_update_incremental(storage):
+    annotations = list(itertools.islice(storage.iter_annotations(
+        simplify_form_types=True), 0, 400))
+    train_annotations, new_annotations = annotations[:300], annotations[300:]
+    model = train(train_annotations, incremental=True)
+    classes = list(model.steps[-1][1].classes_)
+    new_annotations = [a for a in new_annotations if a.type in classes]
+
+    update(model, new_annotations)
+    assert list(model.steps[-1][1].classes_) == classes
+    y_true = [a.type for a in new_annotations]
+    y_pred = model.predict([a.form for a in new_annotations])
+    assert accuracy_score(y_true, y_pred) > 0.8
+
+
+def test_update_not_incremental(storage):
+    annotations = list(itertools.islice(storage.iter_annotations(), 0, 100))
+    model = train(annotations)
+    with pytest.raises(ValueError):
+        update(model, annotations)
+
+
+def test_train_streaming(storage):
+    annotations = list(itertools.islice(storage.iter_annotations(
+        simplify_form_types=True), 0, 300))
+    classes = {a.type for a in annotations}
+    model = train_streaming(
+        iter_chunks=lambda: iter_chunks(annotations, 70),
+        classes=classes,
+        n_epochs=3,
+    )
+    assert set(model.steps[-1][1].classes_) == classes
+    y_true = [a.type for a in annotations]
+    y_pred = model.predict([a.form for a in annotations])
+    assert accuracy_score(y_true, y_pred) > 0.9
+
+
+def test_tune(storage, tmpdir, monkeypatch):
+    params_path = str(tmpdir.join('params.json'))
+    monkeypatch.setenv('FORMASAURUS_PARAMS', params_path)
+    default_params = get_model().get_params(deep=True)
+    annotations = list(itertools.islice(storage.iter_annotations(
+        simplify_form_types=True), 0, 300))
+    params = tune(annotations, n_splits=3, n_candidates=4)
+    assert 'logisticregression__C' in params
+    save_model_params('forms', params)
+    model = get_model()
+    for key, value in params.items():
+        assert model.get_params()[key] == value
+
+    # tuned parameters must not leak to models created later
+    os.remove(params_path)
+    params = get_model().get_params(deep=True)
+    for key in model.get_params():
+        if key.endswith('__min_df') or key.endswith('__C'):
+            assert params[key] == default_params[key]
+
+
+@pytest.mark.parametrize(['dtype'], [['float64'], ['float32'], ['int8']])
+def test_slim(storage, tmpdir, dtype):
+    annotations = list(itertools.islice(storage.iter_annotations(
+        simplify_form_types=True), 0, 300))
+    forms = [a.form for a in annotations]
+    model = train(annotations)
+    slimmed = slim(model, min_weight=0.05, dtype=dtype)
+
+    vec = model.steps[0][1].transformer_list[-1][1].steps[-1][1]
+    vec_slimmed = slimmed.steps[0][1].transformer_list[-1][1].steps[-1][1]
+    assert len(vec_slimmed.vocabulary_) < len(vec.vocabulary_)
+
+    path = str(tmpdir.join('model.joblib'))
+    joblib.dump(slimmed, path)
+    slimmed = joblib.load(path)
+    clf = slimmed.steps[-1][1]
+    if dtype == 'int8':
+        # coefficients are dequantized once, and not saved
+        assert '_coef' not in clf.__dict__
+        assert clf.coef_ is clf.coef_
+        assert '_coef' not in pickle.loads(pickle.dumps(clf)).__dict__
+    assert slimmed.steps[-1][1].coef_.dtype == np.dtype(
+        'float32' if dtype == 'int8' else dtype)
+    probs = model.predict_proba(forms)
+    assert np.abs(slimmed.predict_proba(forms) - probs).mean() < 0.01
+    assert accuracy_score(model.predict(forms), slimmed.predict(forms)) > 0.95
+
+
+def test_print_slimming_report(storage, capsys):
+    annotations = list(itertools.islice(storage.iter_annotations(
+        simplify_form_types=True), 0, 200))
+    print_slimming_report(annotations, min_weights=[0, 0.1],
+                          dtypes=['float32', 'int8'])
+    out, err = capsys.readouterr()
+    lines = out.strip().splitlines()
+    assert len(lines) == 5
+    assert 'accuracy' in lines[0]
@@ -62,6 +62,12 @@ def test_load_html():
     assert tree3 is tree
 
 
+def test_load_html_encoding():
+    html = u"<p>Привет</p>"
+    tree = load_html(html.encode('cp1251'), encoding='cp1251')
+    assert tree.text_content() == u"Привет"
+
+
 def test_get_forms():
     forms = get_forms(load_html("""
     <p>some text</p>
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+import pickle
+
+import numpy as np
+import pytest
+
+from formasaurus.results import FormProba, ProbaView
+
+
+def _result(**kwargs):
+    return FormProba(
+        form_classes=np.array(['login', 'search', 'other']),
+        form_probs=np.array([0.7, 0.05, 0.25]),
+        field_names=['username', 'password', 'username'],
+        field_classes=['username', 'password', 'other'],
+        field_probs=np.array([
+            [0.8, 0.1, 0.1],
+            [0.05, 0.9, 0.05],
+            [0.6, 0.1, 0.3],
+        ]),
+        **kwargs
+    )
+
+
+def test_proba_view():
+    view = ProbaView(['a', 'b', 'c'], np.array([0.5, 0.1, 0.4]), 0.2)
+    assert dict(view) == {'a': 0.5, 'c': 0.4}
+    assert len(view) == 2
+    assert view['c'] == 0.4
+    assert 'b' not in view
+    with pytest.raises(KeyError):
+        view['b']
+    with pytest.raises(KeyError):
+        view['d']
+
+
+def test_form_proba():
+    res = _result(threshold=0.2)
+    assert res.argmax == 'login'
+    assert res.top_k(2) == [('login', 0.7), ('other', 0.25)]
+    assert dict(res.form) == {'login': 0.7, 'other': 0.25}
+    assert list(res.fields) == ['username', 'password']
+    assert res.fields['username'] == {'username': 0.6, 'other': 0.3}
+    assert res.field_argmax == {'username': 'username',
+                                'password': 'password'}
+    assert res.field_top_k('password', 1) == [('password', 0.9)]
+    assert res.to_dict() == {
+        'form': {'login': 0.7, 'other': 0.25},
+        'fields': {
+            'username': {'username': 0.6, 'other': 0.3},
+            'password': {'password': 0.9},
+        },
+    }
+
+
+def test_form_proba_no_fields():
+    res = FormProba(['login', 'search'], np.array([0.3, 0.7]), truncated=True)
+    assert res.fields is None
+    assert res.field_argmax is None
+    assert res.to_dict() == {'form': {'login': 0.3, 'search': 0.7},
+                             'truncated': True}
+
+
+def test_form_proba_pickle():
+    res = _result(threshold=0.1)
+    assert res.fields['password']  # index is built
+    res2 = pickle.loads(pickle.dumps(res, protocol=2))
+    assert res2.to_dict() == res.to_dict()
+    assert not hasattr(res, '__dict__')
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+import sys
+import time
+import socket
+import threading
+import subprocess
+
+import pytest
+import requests
+
+from formasaurus import classifiers
+from formasaurus.server import make_server
+
+
+@pytest.fixture(scope='module')
+def server_url():
+    server = make_server(classifiers.get_instance(), port=0)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    yield 'http://127.0.0.1:%s' % server.server_port
+    server.shutdown()
+    server.server_close()
+
+
+def test_health(server_url):
+    assert requests.get(server_url + '/health').json() == {'status': 'ok'}
+    assert requests.get(server_url + '/ready').json() == {'status': 'ready'}
+    assert requests.get(server_url + '/foo').status_code == 404
+
+
+def test_extract_forms(server_url, login_form):
+    resp = requests.post(server_url + '/extract-forms',
+                         json={'html': login_form})
+    assert resp.status_code == 200
+    forms = resp.json()['forms']
+    assert len(forms) == 1
+    assert forms[0]['form']['login'] > 0.5
+    assert sorted(forms[0]['fields']) == ['password', 'username']
+
+    resp = requests.post(server_url + '/extract-forms',
+                         json={'html': login_form, 'fields': False,
+                               'threshold': 0})
+    forms = resp.json()['forms']
+    assert 'fields' not in forms[0]
+    assert len(forms[0]['form']) > 1
+
+
+def test_extract_forms_batch(server_url, login_form):
+    pages = [{'html': login_form}, {'html': '<p>no forms</p>'}, {'html': ''}]
+    resp = requests.post(server_url + '/extract-forms/batch',
+                         json={'pages': pages})
+    assert resp.status_code == 200
+    results = resp.json()['results']
+    assert [len(res['forms']) for res in results] == [1, 0, 0]
+
+
+@pytest.mark.parametrize(['path', 'body'], [
+    ['/extract-forms', b'not json'],
+    ['/extract-forms', b'[]'],
+    ['/extract-forms', b'{"foo": "bar"}'],
+    ['/extract-forms/batch', b'{"pages": "foo"}'],
+    ['/extract-forms', b'{"html": 123}'],
+    ['/extract-forms', b'{"html": "<form></form>", "threshold": "x"}'],
+    ['/extract-forms', b'{"html": "<form></form>", "fields": "yes"}'],
+    ['/extract-forms/batch', b'{"pages": [{"html": "<p></p>"}, {"html": 1}]}'],
+])
+def test_bad_request(server_url, path, body):
+    resp = requests.post(server_url + path, data=body)
+    assert resp.status_code == 400
+    assert 'error' in resp.json()
+
+
+def _wait_ready(url):
+    for i in range(600):
+        resp = requests.get(url + '/ready')
+        if resp.json()['status'] != 'loading':
+            return resp
+        time.sleep(0.1)
+
+
+def test_comments_only(server_url):
+    resp = requests.post(server_url + '/extract-forms',
+                         json={'html': '<!-- x -->'})
+    assert resp.status_code == 200
+    assert resp.json() == {'forms': []}
+
+
+def test_classification_error(server_url, monkeypatch, login_form):
+    def extract_forms(*args, **kwargs):
+        raise RuntimeError("boom")
+    classifier = classifiers.get_instance()
+    monkeypatch.setattr(classifier, 'extract_forms', extract_forms)
+
+    resp = requests.post(server_url + '/extract-forms',
+                         json={'html': login_form})
+    assert resp.status_code == 500
+    assert 'boom' in resp.json()['error']
+
+    resp = requests.post(server_url + '/extract-forms/batch',
+                         json={'pages': [{'html': login_form}, {'html': ''}]})
+    assert resp.status_code == 200
+    results = resp.json()['results']
+    assert 'boom' in results[0]['error']
+    assert results[1] == {'forms': []}
+
+
+def test_background_loading(tmpdir, login_form):
+    classifiers.get_instance()  # make sure the default model exists
+    server = make_server(port=0, background=True)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    try:
+        url = 'http://127.0.0.1:%s' % server.server_port
+        assert requests.get(url + '/health').status_code == 200
+        assert _wait_ready(url).status_code == 200
+        resp = requests.post(url + '/extract-forms', json={'html': login_form})
+        assert resp.json()['forms'][0]['form']['login'] > 0.5
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    server = make_server(port=0, background=True, strict=True,
+                         model_path=str(tmpdir.join('missing.joblib')))
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    try:
+        url = 'http://127.0.0.1:%s' % server.server_port
+        resp = _wait_ready(url)
+        assert resp.status_code == 503
+        assert resp.json()['status'] == 'error'
+        resp = requests.post(url + '/extract-forms', json={'html': login_form})
+        assert resp.status_code == 503
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_watch_model(tmpdir):
+    path = str(tmpdir.join('model.joblib'))
+    classifiers.get_instance().save(path)
+    server = make_server(model_path=path, port=0)
+    watcher = server.watch_model(3600, path)
+    try:
+        old = server.classifier
+        classifiers.get_instance().save(path)
+        watcher.check()
+        assert watcher.check()
+        assert server.classifier is watcher.classifier
+        assert server.classifier is not old
+    finally:
+        watcher.stop()
+        server.server_close()
+
+
+def test_serve_command(login_form):
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+
+    url = 'http://127.0.0.1:%s' % port
+    proc = subprocess.Popen([sys.executable, '-m', 'formasaurus', 'serve',
+                             '--port', str(port), '--workers', '2'])
+    try:
+        for i in range(600):
+            try:
+                if requests.get(url + '/ready').status_code == 200:
+                    break
+            except requests.ConnectionError:
+                time.sleep(0.1)
+        for i in range(4):
+            resp = requests.post(url + '/extract-forms',
+                                 json={'html': login_form})
+            assert resp.json()['forms'][0]['form']['login'] > 0.5
+    finally:
+        proc.terminate()
+        proc.wait()
@@ -1,5 +1,15 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import
+import os
+import copy
+
+import pytest
+
+from formasaurus.storage import (
+    COMPRESSION_EXTENSIONS,
+    read_html_file,
+    write_html_file,
+)
 
 
 def test_data_ok(storage, capsys):
@@ -43,6 +53,7 @@ def test_storage_add_result(empty_storage):
 
     ann = all_annotations[0]
     assert ann.url == "http://example.com"
+    assert ann.domain == "example"
     assert ann.fields == {'q': 'XX'}
     assert ann.field_types == ['XX']
     assert ann.field_types_full == ['NOT ANNOTATED']
@@ -57,3 +68,193 @@ def test_storage_add_result(empty_storage):
 
     errors = st.check()
     assert errors == 0
+
+
+SEARCH_PAGE = b"""
+<html>
+    <body>
+        <form>
+            <input type='text' name='q'/>
+            <input type='submit' value='Search'>
+        </form>
+    </body>
+</html>
+"""
+
+
+@pytest.mark.parametrize(['compression'], [[None], ['gzip']])
+def test_storage_add_result_compressed(empty_storage, compression):
+    st = empty_storage
+    path = st.add_result(html=SEARCH_PAGE, url="http://example.com",
+                         compression=compression)
+    assert path.endswith(COMPRESSION_EXTENSIONS[compression])
+    assert len(list(st.iter_annotations(drop_na=False))) == 1
+    assert st.check() == 0
+
+
+def test_storage_add_result_uncompressed(empty_storage):
+    st = empty_storage
+    st.compression = 'gzip'
+    assert st.add_result(html=SEARCH_PAGE, url="http://example.com") == \
+        'html/example.com-0.html.gz'
+    assert st.add_result(html=SEARCH_PAGE, url="http://example.com",
+                         compression=None) == 'html/example.com-1.html'
+    assert st.check() == 0
+
+
+def test_storage_compress(empty_storage):
+    st = empty_storage
+    st.add_result(html=SEARCH_PAGE, url="http://example.com")
+    st.add_result(html=SEARCH_PAGE, url="http://example.com")
+    size = os.path.getsize(os.path.join(st.folder, 'html/example.com-0.html'))
+
+    assert st.compress('gzip', verbose=False) == 2
+    assert sorted(st.get_index().keys()) == [
+        'html/example.com-0.html.gz',
+        'html/example.com-1.html.gz',
+    ]
+    assert not os.path.exists(os.path.join(st.folder, 'html/example.com-0.html'))
+    gz_size = os.path.getsize(os.path.join(st.folder, 'html/example.com-0.html.gz'))
+    assert gz_size < size
+    assert st.compress('gzip', verbose=False) == 0
+
+    # new files don't clash with compressed ones
+    path = st.add_result(html=SEARCH_PAGE, url="http://example.com")
+    assert path == 'html/example.com-2.html'
+
+    assert len(list(st.iter_trees())) == 3
+    assert st.check() == 0
+
+    assert st.compress(None, verbose=False) == 2
+    assert len(list(st.iter_trees())) == 3
+    assert st.check() == 0
+
+
+def test_storage_compress_interrupted(empty_storage, monkeypatch):
+    from formasaurus import storage as storage_module
+    st = empty_storage
+    st.add_result(html=SEARCH_PAGE, url="http://example.com")
+    st.add_result(html=SEARCH_PAGE, url="http://example.com")
+
+    calls = []
+
+    def write_or_fail(path, data, compression=None):
+        if calls:
+            raise IOError("disk full")
+        calls.append(path)
+        write_html_file(path, data, compression)
+
+    monkeypatch.setattr(storage_module, 'write_html_file', write_or_fail)
+    with pytest.raises(IOError):
+        st.compress('gzip', verbose=False)
+    monkeypatch.undo()
+
+    # index still points to the original files
+    assert sorted(st.get_index().keys()) == [
+        'html/example.com-0.html',
+        'html/example.com-1.html',
+    ]
+    assert st.check() == 0
+
+    assert st.compress('gzip', verbose=False) == 2
+    assert len(list(st.iter_trees())) == 2
+    assert st.check() == 0
+
+
+def test_read_html_file_magic_bytes(tmpdir):
+    path = str(tmpdir.join('page.html'))
+    write_html_file(path, SEARCH_PAGE, 'gzip')
+    assert read_html_file(path) == SEARCH_PAGE
+    write_html_file(path, SEARCH_PAGE, None)
+    assert read_html_file(path) == SEARCH_PAGE
+
+
+def test_read_html_file_zstd(tmpdir):
+    pytest.importorskip('zstandard')
+    path = str(tmpdir.join('page.html.zst'))
+    write_html_file(path, SEARCH_PAGE, 'zstd')
+    assert read_html_file(path) == SEARCH_PAGE
+
+
+def test_storage_fingerprints(empty_storage):
+    st = empty_storage
+    st.add_result(html=SEARCH_PAGE, url="http://example.com",
+                  form_answers=['s'])
+    st.add_result(html=SEARCH_PAGE, url="http://example.com",
+                  form_answers=['s'])
+    index = st.get_index()
+    fingerprints = [info['fingerprints'] for info in index.values()]
+    assert fingerprints[0] == fingerprints[1]
+    assert len(fingerprints[0]) == 1
+
+    assert len(list(st.iter_annotations())) == 1
+    assert len(list(st.iter_annotations(drop_duplicates=False))) == 2
+    assert st.get_form_type_counts(verbose=False) == {'s': 1}
+    assert st.get_form_type_counts(drop_duplicates=False,
+                                   verbose=False) == {'s': 2}
+
+
+def test_storage_reindex(empty_storage):
+    st = empty_storage
+    st.add_result(html=SEARCH_PAGE, url="http://example.com",
+                  form_answers=['l'])
+    index = st.get_index()
+    fingerprints = {k: info.pop('fingerprints') for k, info in index.items()}
+    st.write_index(index)
+    assert st.get_form_type_counts(simplify=True, verbose=False) == {'o': 1}
+
+    st.reindex(verbose=False)
+    index = st.get_index()
+    assert {k: info['fingerprints'] for k, info in index.items()} == fingerprints
+    assert st.get_form_type_counts(simplify=False, verbose=False) == {'l': 1}
+
+
+def test_all_form_type_counts(empty_storage, capsys):
+    st = empty_storage
+    st.add_result(html=SEARCH_PAGE, url="http://example.com",
+                  form_answers=['l'])
+    st.add_result(html=SEARCH_PAGE, url="http://example.org",
+                  form_answers=['s'])
+    index = st.get_index()
+    for info in index.values():
+        del info['fingerprints']
+    st.write_index(index)
+
+    assert st.check(verbose=False) == 0
+    assert len(st._fingerprints_cache) == 2
+
+    detailed, simplified = st.get_all_form_type_counts(verbose=False)
+    assert detailed == {'l': 1}
+    assert simplified == {'o': 1}
+
+    detailed, simplified = st.get_all_form_type_counts(drop_duplicates=False,
+                                                       verbose=False)
+    assert detailed == {'l': 1, 's': 1}
+    assert simplified == {'o': 1, 's': 1}
+
+    capsys.readouterr()
+    st.print_all_form_type_counts(verbose=False)
+    out, err = capsys.readouterr()
+    assert 'detailed classes' in out
+    assert 'simplified classes' in out
+    assert '(o)' in out
+
+
+def test_iter_annotations_simplify_field_types(storage):
+    field_schema = storage.get_field_schema()
+    index = storage.get_index()
+    key = next(k for k, info in index.items() if len(info['forms']) > 1)
+    original = copy.deepcopy(index[key])
+
+    annotations = list(storage.iter_annotations(
+        index={key: index[key]},
+        drop_duplicates=False,
+        drop_na=False,
+        drop_skipped=False,
+        simplify_field_types=True,
+    ))
+    assert len(annotations) == len(original['forms'])
+    assert index[key] == original
+    assert all(ann.info is annotations[0].info for ann in annotations)
+    for ann in annotations:
+        assert not set(ann.fields.values()) & set(field_schema.simplify_map)
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+import os
+import socket
+import threading
+
+import lxml.html
+
+from formasaurus import utils
+from formasaurus.utils import (
+    fork_map,
+    fork_call,
+    get_domain,
+    load_model_params,
+    save_model_params,
+)
+
+
+def test_fork_map():
+    items = list(range(1000))
+    assert fork_map(str, items, n_jobs=2, chunk_size=7) == [str(i) for i in items]
+    assert fork_map(str, items, n_jobs=1) == [str(i) for i in items]
+    assert fork_map(str, [], n_jobs=2) == []
+
+
+def test_fork_map_unpicklable():
+    tree = lxml.html.fromstring("<div>%s</div>" % ("<p>hello</p>" * 300))
+    elems = tree.xpath("//p")
+    assert fork_map(lambda el: el.text, elems, n_jobs=2) == ["hello"] * 300
+
+
+def test_fork_call():
+    assert fork_call([lambda: 1, lambda: 2]) == [1, 2]
+    # fork_map is sequential in workers
+    assert fork_call([lambda: fork_map(str, range(100), n_jobs=2, chunk_size=7)]) == \
+        [[str(i) for i in range(100)]]
+
+
+def test_fork_map_no_shared_state():
+    assert fork_map(str, range(100), n_jobs=2, chunk_size=7)
+    assert utils._fork_map_state is None
+
+
+def test_fork_map_daemon_thread():
+    stop = threading.Event()
+    thread = threading.Thread(target=stop.wait)
+    thread.daemon = True
+    thread.start()
+    try:
+        pids = fork_map(lambda item: os.getpid(), range(10), n_jobs=2,
+                        chunk_size=5)
+        assert os.getpid() not in pids
+    finally:
+        stop.set()
+        thread.join()
+
+
+def test_fork_call_from_thread():
+    results = []
+    thread = threading.Thread(
+        target=lambda: results.extend(fork_call([os.getpid, os.getpid])))
+    thread.start()
+    thread.join()
+    assert results == [os.getpid(), os.getpid()]
+
+
+def test_fork_call_with_running_threads():
+    stop = threading.Event()
+    thread = threading.Thread(target=stop.wait)
+    thread.start()
+    try:
+        assert fork_call([os.getpid, os.getpid]) == [os.getpid(), os.getpid()]
+    finally:
+        stop.set()
+        thread.join()
+
+
+def test_get_domain_offline(monkeypatch):
+    def no_network(*args, **kwargs):
+        raise AssertionError("network access")
+    monkeypatch.setattr(socket, 'socket', no_network)
+    # the public suffix list must be loaded without network too
+    monkeypatch.setattr(utils, '_tld_extractor', None)
+
+    assert get_domain('http://foo.example.co.uk/path') == 'example'
+    hits = get_domain.cache_info().hits
+    for i in range(3):
+        assert get_domain('http://foo.example.co.uk/path') == 'example'
+    assert get_domain.cache_info().hits == hits + 3
+    assert get_domain('http://sub.example2.org') == 'example2'
+
+
+def test_model_params(tmpdir, monkeypatch):
+    monkeypatch.setenv('FORMASAURUS_PARAMS', str(tmpdir.join('params.json')))
+    assert load_model_params('forms') == {}
+    save_model_params('forms', {'C': 1.5})
+    save_model_params('fields', {'c1': 0.1})
+    assert load_model_params('forms') == {'C': 1.5}
+    assert load_model_params('fields') == {'c1': 0.1}
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+import time
+
+import pytest
+
+from formasaurus import classifiers
+from formasaurus.watcher import ModelWatcher
+
+
+@pytest.fixture
+def model_path(tmpdir):
+    path = str(tmpdir.join('model.joblib'))
+    classifiers.get_instance().save(path)
+    return path
+
+
+def test_save_atomic(model_path, tmpdir):
+    classifiers.get_instance().save(model_path)
+    assert tmpdir.listdir() == [tmpdir.join('model.joblib')]
+
+
+def test_model_watcher(model_path):
+    reloaded = []
+    watcher = ModelWatcher(model_path, interval=3600,
+                           on_reload=reloaded.append).start()
+    try:
+        assert not watcher.check()
+        classifiers.get_instance().save(model_path)
+        assert not watcher.check()  # the file may be incomplete
+        assert watcher.check()
+        assert len(reloaded) == 1
+        assert watcher.classifier is reloaded[0]
+        assert watcher.classifier.thread_safe
+        assert watcher.classifier._get_field_model()._tagger is not None
+        # the tagger is not shared between threads
+        assert watcher.classifier._field_model._tagger is None
+        assert not watcher.check()
+
+        with open(model_path, 'wb') as f:
+            f.write(b'broken')
+        assert not watcher.check()
+        with pytest.warns(UserWarning):
+            assert not watcher.check()
+        assert watcher.last_error is not None
+        assert not watcher.check()
+        assert len(reloaded) == 1
+    finally:
+        watcher.stop()
+
+
+def test_watch_model(model_path, monkeypatch):
+    monkeypatch.setenv('FORMASAURUS_MODEL', model_path)
+    monkeypatch.setattr(classifiers, '_form_field_classifier', None)
+    watcher = classifiers.watch_model(interval=0.05)
+    try:
+        old = classifiers.get_instance()
+        classifiers.get_instance().save(model_path)
+        for i in range(600):
+            if classifiers.get_instance() is not old:
+                break
+            time.sleep(0.1)
+        new = classifiers.get_instance()
+        assert new is not old
+        assert new.thread_safe
+    finally:
+        watcher.stop()
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+import io
+import sys
+import json
+import struct
+import subprocess
+
+import pytest
+
+from formasaurus import classifiers
+from formasaurus.worker import run_worker
+
+
+@pytest.fixture
+def worker_requests(login_form):
+    return [
+        {'id': 1, 'html': login_form},
+        {'id': 'two', 'html': login_form * 2, 'fields': False, 'max_forms': 1},
+        {'id': 3, 'html': ''},
+        {'id': 4},
+        [1, 2],
+    ]
+
+
+def _check_responses(responses):
+    assert [resp['id'] for resp in responses] == [1, 'two', 3, 4, None]
+    forms = responses[0]['forms']
+    assert len(forms) == 1
+    assert forms[0]['form']['login'] > 0.5
+    assert sorted(forms[0]['fields']) == ['password', 'username']
+
+    assert len(responses[1]['forms']) == 1
+    assert 'fields' not in responses[1]['forms'][0]
+    assert responses[1]['truncated']
+
+    assert responses[2]['forms'] == []
+    assert 'error' in responses[3]
+    assert 'error' in responses[4]
+
+
+def test_worker_ndjson(worker_requests):
+    lines = [json.dumps(req) for req in worker_requests]
+    lines.insert(2, '')
+    lines.append('not json')
+    stdin = io.BytesIO('\n'.join(lines).encode('utf8'))
+    stdout = io.BytesIO()
+    run_worker(classifiers.get_instance(), stdin, stdout)
+    responses = [json.loads(line)
+                 for line in stdout.getvalue().decode('utf8').splitlines()]
+    assert 'error' in responses.pop()
+    _check_responses(responses)
+
+
+def _frame(data):
+    return struct.pack('>I', len(data)) + data
+
+
+def test_worker_length_prefixed(worker_requests):
+    data = b''.join(_frame(json.dumps(req).encode('utf8'))
+                    for req in worker_requests)
+    stdout = io.BytesIO()
+    run_worker(classifiers.get_instance(), io.BytesIO(data), stdout,
+               framing='length')
+    stdout.seek(0)
+    responses = []
+    while True:
+        header = stdout.read(4)
+        if not header:
+            break
+        length, = struct.unpack('>I', header)
+        responses.append(json.loads(stdout.read(length).decode('utf8')))
+    _check_responses(responses)
+
+    with pytest.raises(EOFError):
+        run_worker(classifiers.get_instance(), io.BytesIO(data[:-3]),
+                   io.BytesIO(), framing='length')
+
+
+def test_worker_command(worker_requests):
+    classifiers.get_instance()  # make sure the default model exists
+    proc = subprocess.Popen(
+        [sys.executable, '-m', 'formasaurus', 'worker', '--strict'],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+    requests = [json.dumps(req).encode('utf8') for req in worker_requests]
+    out, err = proc.communicate(b'\n'.join(requests) + b'\n')
+    assert proc.returncode == 0
+    responses = [json.loads(line) for line in out.decode('utf8').splitlines()]
+    _check_responses(responses)